@@ -1,17 +1,50 @@
-def segmentation_diff(default_tokenizer, others, corpus,special):
-    corpus_str = "".join(corpus)
-    splitted_text = corpus_str.split()
-    default_tokenized_corpus = [default_tokenizer.tokenize(pre_token) for pre_token in splitted_text]
-    tokenized_corpuses = [[tokenizer.tokenize(pre_token) for pre_token in splitted_text] for tokenizer in others]
-    for i, tokenized_corpus in enumerate(tokenized_corpuses):
-        tokenizer = others[i]
-        diff = total = 0
-        for default_tokenization, tokenization in zip(default_tokenized_corpus, tokenized_corpus):
-            if default_tokenization != tokenization:
-                if special == "##" and "equal" in tokenizer.get_type():
-                    default_tokenization = list(map(lambda tok: "##" + tok if not tok.startswith("##") else tok,default_tokenization))
-                    default_tokenization[0] = default_tokenization[0][2:]
-                if default_tokenization != tokenization:
-                    diff += 1
-            total += 1
-        print(f"for tokenizer {tokenizer.get_type()} the diff is {diff / total}")
\ No newline at end of file
+from typing import List
+import numpy as np
+import pandas as pd
+from const import CORPUS_CHUNK_SIZE
+from tokenized_corpus import count_words
+
+
+def segmentation_diff(names: List[str], tokenizers, special, cache, corpus_path, weighted=True,
+                      chunk_size=CORPUS_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    The pairwise segmentation disagreement between the tokenizers over the whitespace separated words of the corpus:
+    the fraction of word occurrences (or of word types if not weighted) which two tokenizers segment differently.
+    Word types are compared in chunks over fingerprints of the segmentations (memory mapped from the cache),
+    so memory does not grow with the number of tokenizers times the size of the corpus.
+    """
+    diff, total = disagreement_counts(tokenizers, special, cache, corpus_path, weighted, chunk_size)
+    return pd.DataFrame(diff / total, index=names, columns=names)
+
+
+def disagreement_counts(tokenizers, special, cache, corpus_path, weighted=True,
+                        chunk_size=CORPUS_CHUNK_SIZE) -> tuple[np.ndarray, float]:
+    """
+    :return: the number of word occurrences (or of word types if not weighted) every pair of tokenizers segments
+    differently, and the number of word occurrences (or of word types) of the corpus.
+    The occurrence counts of the shards of a corpus add up to those of the whole corpus.
+    """
+    word_counts = count_words(cache.read_corpus(corpus_path))
+    if weighted:
+        weights = np.fromiter(word_counts.values(), dtype=np.float64, count=len(word_counts))
+    else:
+        weights = np.ones(len(word_counts), dtype=np.float64)
+    del word_counts
+    fingerprints = [cache.word_fingerprints(tokenizer, corpus_path) for tokenizer in tokenizers]
+
+    # WP_equal_like tokenizers print every token but the first with ##, so they are compared with the other
+    # tokenizers after the same transformation is applied to the segmentation of the other tokenizer
+    equal_like = np.array([special == "##" and "equal" in tokenizer.get_type() for tokenizer in tokenizers])
+    mixed = equal_like[:, None] != equal_like[None, :]
+    converted_row = np.where(equal_like, 0, 1)
+
+    diff = np.zeros((len(tokenizers), len(tokenizers)))
+    for start in range(0, len(weights), chunk_size):
+        chunk = np.stack([np.asarray(fingerprint[:, start:start + chunk_size]) for fingerprint in fingerprints])
+        raw = chunk[:, 0]
+        converted = chunk[np.arange(len(tokenizers)), converted_row]
+        for i in range(len(tokenizers)):
+            differ = raw[i] != raw
+            differ = np.where(mixed[i][:, None], differ & (converted[i] != converted), differ)
+            diff[i] += differ @ weights[start:start + chunk_size]
+    return diff, weights.sum()
@@ -1,33 +1,113 @@
+from typing import List
+import numpy as np
 import pandas as pd
-from scipy.stats import pearsonr, spearmanr, kendalltau
+from scipy.stats import pearsonr, spearmanr
+from Intrinsic_measures.registry import register
+from Intrinsic_measures.resampling import Bootstrap
+from tokenized_corpus import TokenIds
 
+# the correlation of the wordiness with the human measurements
+COG_CORRELATION = "pearson"
+CORRELATIONS = {"pearson": pearsonr, "spearman": spearmanr}
+MEASURES = ["rt", "accuracy"]
 
-def eval_cog(cog_path: str, tokenizer, special: str | None):
+
+def load_cog(cog_path: str) -> dict[str, pd.DataFrame]:
     cog_data = pd.read_csv(cog_path)
     cog_data = cog_data.dropna()
     words = cog_data[cog_data["lexicality"] == "W"]
     nonwords = cog_data[cog_data["lexicality"] == "N"]
+    return {"words": words, "nonwords": nonwords}
+
+
+def correlation_name(category: str, measure: str) -> str:
+    return category + "_chunkability_" + {"rt": "rts", "accuracy": "accs"}[measure]
+
+
+def get_wordiness(tokenizer, dataset: pd.DataFrame) -> np.ndarray:
+    # splits in model output
+    words = list(dataset["spelling"])
+    num_of_tokens = TokenIds.build(tokenizer, words).lengths()
+    return 1 - num_of_tokens / np.array([len(str(word)) for word in words])
+
+
+def resampled_correlations(wordiness: dict[str, np.ndarray], datasets: dict[str, pd.DataFrame],
+                           bootstrap: Bootstrap) -> dict[str, np.ndarray]:
+    """
+    :param wordiness: the wordiness of every category by every tokenizer, of shape (number of tokenizers, number of words)
+    :return: every correlation and the cog_score of every tokenizer in every bootstrap resample,
+    of shape (number of tokenizers, number of resamples)
+    """
+    resampled = {}
+    for category, dataset in datasets.items():
+        for measure in MEASURES:
+            # the measures of a category are resampled alike, the categories independently
+            resampled[correlation_name(category, measure)] = bootstrap.correlations(
+                wordiness[category], dataset[measure].to_numpy(dtype=np.float64), category, COG_CORRELATION)
+    resampled["cog_score"] = np.mean([np.abs(values) for values in resampled.values()], axis=0)
+    return resampled
 
-    datasets = {"words": words, "nonwords": nonwords}
+
+@register("cognitive_correlation", requires=["cognitive_data", "tokenizer", "special", "bootstrap"])
+def eval_cog(datasets: dict[str, pd.DataFrame], tokenizer, special: str | None, bootstrap: Bootstrap | None = None):
+    """
+    :param bootstrap: adds the bootstrap confidence interval of every correlation and of the cog_score,
+    and the permutation p-value of every correlation
+    """
     all_results = {}
     avg_corr = 0
+    wordiness = {}
     for category, dataset in datasets.items():
-        # measurements
-        words = list(dataset["spelling"])
-        rts = list(dataset["rt"])
-        accs = list(dataset["accuracy"])
-
-        # splits in model output
-        tokens = list([tokenizer.tokenize(word) for word in words])
-        wordiness = [1 - (len(tokens[i]) / len(str(words[i]))) for i in range(len(dataset))]
+        wordiness[category] = get_wordiness(tokenizer, dataset)
 
         # correlation
-        corr1, p1 = pearsonr(wordiness, rts)
-        corr2, p2 = pearsonr(wordiness, accs)
+        corr1, p1 = CORRELATIONS[COG_CORRELATION](wordiness[category], dataset["rt"])
+        corr2, p2 = CORRELATIONS[COG_CORRELATION](wordiness[category], dataset["accuracy"])
 
         category_results = {category + "_chunkability_rts": corr1, category + "_chunkability_accs": corr2}
         avg_corr += abs(corr1)
         avg_corr += abs(corr2)
         all_results.update(category_results)
     all_results["cog_score"] = avg_corr/4
+    if bootstrap is None:
+        return all_results
+
+    wordiness = {category: values[None, :] for category, values in wordiness.items()}
+    for name, values in resampled_correlations(wordiness, datasets, bootstrap).items():
+        low, high = bootstrap.interval(values[0])
+        all_results[f"{name}_ci_low"] = low
+        all_results[f"{name}_ci_high"] = high
+    for category, dataset in datasets.items():
+        for measure in MEASURES:
+            all_results[f"{correlation_name(category, measure)}_p"] = bootstrap.permutation_pvalues(
+                wordiness[category], dataset[measure].to_numpy(dtype=np.float64), category, COG_CORRELATION)[0]
     return all_results
+
+
+def cog_differences(names: List[str], tokenizers: list, datasets: dict[str, pd.DataFrame],
+                    bootstrap: Bootstrap) -> pd.DataFrame:
+    """
+    Paired bootstrap tests of the differences between the cognitive correlations of every pair of tokenizers,
+    all the tokenizers are evaluated on the same resamples of the word lists
+    :return: a row for every pair of tokenizers and every correlation (and the cog_score): the difference, its
+    confidence interval and the two-sided p-value of no difference
+    """
+    wordiness = {category: np.stack([get_wordiness(tokenizer, dataset) for tokenizer in tokenizers])
+                 for category, dataset in datasets.items()}
+    estimates = {}
+    for category, dataset in datasets.items():
+        for measure in MEASURES:
+            estimates[correlation_name(category, measure)] = np.array([
+                CORRELATIONS[COG_CORRELATION](values, dataset[measure])[0] for values in wordiness[category]])
+    estimates["cog_score"] = np.mean([np.abs(values) for values in estimates.values()], axis=0)
+    first, second = np.triu_indices(len(tokenizers), k=1)
+    rows = []
+    for name, values in resampled_correlations(wordiness, datasets, bootstrap).items():
+        differences = values[first] - values[second]
+        low, high = bootstrap.interval(differences)
+        # the share of the resampled differences on the other side of zero, on either side
+        p_values = np.minimum(1, 2 * np.minimum((differences <= 0).mean(axis=1), (differences >= 0).mean(axis=1)))
+        rows.append(pd.DataFrame({"tokenizer": np.array(names)[first], "other": np.array(names)[second],
+                                  "measure": name, "difference": estimates[name][first] - estimates[name][second],
+                                  "ci_low": low, "ci_high": high, "p_value": p_values}))
+    return pd.concat(rows, ignore_index=True)
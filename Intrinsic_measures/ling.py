@@ -1,19 +1,23 @@
 import pandas as pd
-from Intrinsic_measures.ling_utils import get_seg_coverage
+from Intrinsic_measures.ling_utils import GoldSegmentations, get_seg_coverage
+from Intrinsic_measures.registry import register
 
+DATASETS = ["Ladec", "MorphoLex", "MorphyNet", "Dago_Bert", "UniMorph", "UnBlend", "CompoundPiece"]
 
-def combined_coverage(combined_path: str, tokenizer, special):
+
+def load_combined(combined_path: str) -> dict[str, GoldSegmentations]:
     df = pd.read_csv(combined_path, sep=",")
-    get_gstandard = lambda row: eval(row['Gold_standard_segmentation'])
-    datasets = ["Ladec", "MorphoLex", "MorphyNet", "Dago_Bert", "UniMorph", "UnBlend", "CompoundPiece"]
+    return {dataset: GoldSegmentations.from_frame(df.loc[df['Origin'] == dataset]) for dataset in DATASETS}
+
+
+@register("morphological_f1", requires=["gold_segmentations", "tokenizer", "special"])
+def combined_coverage(gold_datasets: dict[str, GoldSegmentations], tokenizer, special):
     coverage = {}
     avg_f1 = 0
-    for dataset in datasets:
-        curr_coverage = get_seg_coverage(df.loc[df['Origin'] == dataset], tokenizer,
-                                         'Word',
-                                         get_gstandard, special)
+    for dataset in DATASETS:
+        curr_coverage = get_seg_coverage(gold_datasets[dataset], tokenizer, special)
         avg_f1 += curr_coverage['f1']
         curr_coverage = {dataset + "_" + key: val for key, val in curr_coverage.items()}
         coverage.update(curr_coverage)
-    coverage["avg_f1"] = avg_f1 / len(datasets)
-    return coverage
+    coverage["avg_f1"] = avg_f1 / len(DATASETS)
+    return coverage
\ No newline at end of file
@@ -1,44 +1,91 @@
+import ast
 from typing import List
+import numpy as np
+import pandas as pd
+from tokenized_corpus import TokenIds
 
 
-# Function to get_boundaries from a tokenization
-def get_boundaries(tokenization: List[str]) -> List[int]:
-    boundaries = [len(''.join(tokenization[:i])) for i in range(1, len(tokenization))]
-    return boundaries
-
-
-def get_seg_coverage(x, tokenizer, key_in_df, get_gstandard,
-                     special: str) -> dict[str:float]:
-    tps = fps = fns = length = count = 0
-    for _, row in x.iterrows():
-        # Gold standard morphological segmentation from the dataset
-        gstandard = get_gstandard(row)
-        gstandard[0] = "Ġ" + gstandard[0]
-        if "".join(gstandard) not in tokenizer.get_vocab():
-            if special == "##":
-                gstandard = list(map(lambda tok: "##" + tok, gstandard))
-                gstandard[0] = gstandard[0][2:]
-            if all(
-                    token in tokenizer.get_vocab() for token in gstandard):
-                count += 1
-                # Tokenise the compound with the given tokeniser
-                y = [x for x in tokenizer.tokenize(row[key_in_df])]
-                # Get the boundaries for the gold standard and the tokeniser
-                gstandard_boundaries = get_boundaries(gstandard)
-                y_boundaries = get_boundaries(y)
-                fn = 0
-                for i in y_boundaries:
-                    if i in gstandard_boundaries:
-                        # True positives are those appearing in both generated and reference
-                        tps += 1
-                    else:
-                        # False positives are those appearing in the generated but not the reference
-                        fps += 1
-                for i in gstandard_boundaries:
-                    if i not in y_boundaries:
-                        # False negatives are those appearing in the reference but not the generated
-                        fn += 1
-                fns += fn
-                length += len(y)
+class GoldSegmentations:
+    """
+    Gold standard morphological segmentations in a columnar form:
+    the morphemes of all the words flattened into one column, with the offsets of every word's morphemes.
+    """
+
+    def __init__(self, words: List[str], segmentations: List[List[str]]):
+        self.words = np.array(words, dtype=object)
+        self.morphemes = pd.Series([morpheme for segmentation in segmentations for morpheme in segmentation],
+                                   dtype=object)
+        self.morpheme_lengths = self.morphemes.str.len().to_numpy(dtype=np.int64)
+        self.joined = pd.Series(["".join(segmentation) for segmentation in segmentations], dtype=object)
+        counts = np.array([len(segmentation) for segmentation in segmentations], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.row_ids = np.repeat(np.arange(len(counts)), counts)
+        self.positions = np.arange(len(self.morphemes)) - self.offsets[self.row_ids]
+        self.is_first = self.positions == 0
+        self.is_last = self.positions == counts[self.row_ids] - 1
+
+    @staticmethod
+    def from_frame(df: pd.DataFrame, key_in_df: str = 'Word', gold_key: str = 'Gold_standard_segmentation'):
+        segmentations = [ast.literal_eval(cell) for cell in df[gold_key]]
+        return GoldSegmentations(list(df[key_in_df]), segmentations)
+
+    def __len__(self):
+        return len(self.words)
+
+
+def get_boundaries(lengths: np.ndarray, rows: np.ndarray, is_first: np.ndarray, is_last: np.ndarray,
+                   stride: int) -> np.ndarray:
+    """
+    The boundaries of a batch of tokenizations given the flattened token lengths:
+    the character offset at the end of every token but the last one of its word,
+    encoded together with the row of the word as row * stride + offset
+    """
+    ends = np.cumsum(lengths)
+    # the index of the first token of the word of every token
+    first = np.maximum.accumulate(np.where(is_first, np.arange(len(lengths)), 0))
+    offsets = ends - (ends[first] - lengths[first])
+    return (rows * stride + offsets)[~is_last]
+
+
+def get_seg_coverage(gold: GoldSegmentations, tokenizer, special: str) -> dict[str:float]:
+    vocab = tokenizer.get_vocab()
+    # the first morpheme carries the word boundary marker, the rest the continuation prefix of WordPiece vocabularies
+    continuation = "##" if special == "##" else ""
+    prefixes = np.where(gold.is_first, "Ġ", continuation).astype(object)
+    gold_tokens = prefixes + gold.morphemes.to_numpy()
+    in_vocab = pd.Series(gold_tokens, dtype=object).isin(vocab.keys()).to_numpy()
+    # the words without a gold segmentation are never selected
+    counts = np.diff(gold.offsets)
+    all_in_vocab = (np.bincount(gold.row_ids, weights=in_vocab, minlength=len(gold)) == counts) & (counts > 0)
+    word_in_vocab = ("Ġ" + gold.joined).isin(vocab.keys()).to_numpy()
+    selected = np.flatnonzero(~word_in_vocab & all_in_vocab)
+
+    # Gold standard boundaries of the selected words
+    morpheme_mask = np.isin(gold.row_ids, selected)
+    gold_lengths = gold.morpheme_lengths + np.where(gold.is_first, 1, len(continuation))
+    gold_lengths = gold_lengths[morpheme_mask]
+    gold_rows = gold.row_ids[morpheme_mask]
+    gold_is_first = gold.is_first[morpheme_mask]
+    gold_is_last = gold.is_last[morpheme_mask]
+
+    # Tokenise the selected words with the given tokeniser
+    tokenizations = TokenIds.build(tokenizer, list(gold.words[selected]))
+    y_lengths = tokenizations.token_lengths()
+    y_counts = tokenizations.lengths()
+    y_rows = np.repeat(selected, y_counts)
+    y_positions = np.arange(len(y_lengths)) - np.repeat(np.cumsum(y_counts) - y_counts, y_counts)
+    y_is_first = y_positions == 0
+    y_is_last = y_positions == np.repeat(y_counts, y_counts) - 1
+
+    stride = int(max(gold_lengths.sum(), y_lengths.sum())) + 1
+    gstandard_boundaries = get_boundaries(gold_lengths, gold_rows, gold_is_first, gold_is_last, stride)
+    y_boundaries = get_boundaries(y_lengths, y_rows, y_is_first, y_is_last, stride)
+
+    # True positives are those appearing in both generated and reference
+    tps = int(np.isin(y_boundaries, gstandard_boundaries).sum())
+    # False positives are those appearing in the generated but not the reference
+    fps = len(y_boundaries) - tps
+    # False negatives are those appearing in the reference but not the generated
+    fns = int((~np.isin(gstandard_boundaries, y_boundaries)).sum())
     f1 = tps / (tps + 0.5 * (fps + fns))
-    return {"f1": f1}
\ No newline at end of file
+    return {"f1": f1}
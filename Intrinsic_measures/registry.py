@@ -0,0 +1,51 @@
+from collections import Counter
+from typing import List
+
+
+class Metric:
+    """
+    A metric of a single tokenizer and the inputs it consumes
+    """
+
+    def __init__(self, name: str, compute, requires: List[str]):
+        self.name = name
+        self.compute = compute
+        # the inputs of compute in the order of its parameters: the prerequisites it consumes
+        # (tokenized_corpus, gold_segmentations, cognitive_data) or the tokenizer, its special prefix and the bootstrap
+        self.requires = requires
+
+
+# the registered metrics by name, in the order they are registered
+METRICS: dict[str, Metric] = {}
+# the inputs of the metrics which are given rather than computed
+CONTEXT = ("tokenizer", "special", "bootstrap")
+
+
+def register(name: str, requires: List[str]):
+    def decorator(compute):
+        METRICS[name] = Metric(name, compute, requires)
+        return compute
+    return decorator
+
+
+def schedule(names: List[str] | None = None) -> List[Metric]:
+    """
+    :param names: the selected metrics, all of them if None
+    :return: the selected metrics ordered so that the metrics consuming the same prerequisite run one after the other
+    """
+    selected = [metric for name, metric in METRICS.items() if names is None or name in names]
+    first_use = {}
+    for position, metric in enumerate(selected):
+        for prerequisite in prerequisites(metric):
+            first_use.setdefault(prerequisite, position)
+    return sorted(selected, key=lambda metric: min((first_use[prerequisite] for prerequisite in prerequisites(metric)),
+                                                   default=0))
+
+
+def prerequisites(metric: Metric) -> List[str]:
+    return [name for name in metric.requires if name not in CONTEXT]
+
+
+def consumers(metrics: List[Metric]) -> Counter:
+    # the number of the given metrics consuming every prerequisite, so it can be freed after its last consumer
+    return Counter(prerequisite for metric in metrics for prerequisite in prerequisites(metric))
@@ -0,0 +1,154 @@
+import zlib
+import numpy as np
+
+# bounds the number of elements of the matrices of a batch of resamples
+BATCH_ELEMENTS = 2 ** 20
+
+
+def weighted_pearson(x: np.ndarray, y: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    :param x: (number of variables, number of items), e.g. the wordiness of the words by every tokenizer
+    :param y: (number of items,)
+    :param weights: (number of resamples, number of items), the number of times every item is drawn
+    :return: (number of variables, number of resamples), the Pearson correlation of every variable with y
+    in every resample, computed from the weighted sums of a few matrix products
+    """
+    # centered so the differences of the sums below do not cancel out
+    x = x - x.mean(axis=1, keepdims=True)
+    y = y - y.mean()
+    n = weights.sum(axis=1)
+    sum_x = x @ weights.T
+    sum_y = weights @ y
+    covariance = n * ((x * y) @ weights.T) - sum_x * sum_y
+    variance_x = n * ((x * x) @ weights.T) - sum_x ** 2
+    variance_y = n * (weights @ (y * y)) - sum_y ** 2
+    return covariance / np.sqrt(variance_x * variance_y)
+
+
+def value_ranks(values: np.ndarray, weights: np.ndarray):
+    """
+    :return: the rank of every distinct value among the items drawn by every resample, tied items get their average
+    rank as in scipy.stats.rankdata, and the number of times the items of every distinct value are drawn,
+    both of shape (number of resamples, number of distinct values), and the items of every distinct value
+    """
+    unique, inverse = np.unique(values, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    starts = np.flatnonzero(np.diff(inverse[order], prepend=-1))
+    counts = np.add.reduceat(weights[:, order], starts, axis=1)
+    ranks = np.cumsum(counts, axis=1) - counts + (counts + 1) / 2
+    return ranks, counts, (inverse, order, starts)
+
+
+def resample_ranks(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    # the rank of every item among the items drawn by every resample, (number of resamples, number of items)
+    ranks, _, (inverse, _, _) = value_ranks(values, weights)
+    return ranks[:, inverse]
+
+
+def weighted_spearman(x: np.ndarray, y: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    The Spearman correlation of every variable with y in every resample, see weighted_pearson.
+    The sums over the items of a variable are summed over its distinct values, which are few for the wordiness.
+    """
+    y_ranks = resample_ranks(y, weights)
+    n = weights.sum(axis=1)
+    weighted_y = weights * y_ranks
+    sum_y = weighted_y.sum(axis=1)
+    variance_y = n * (weighted_y * y_ranks).sum(axis=1) - sum_y ** 2
+    correlations = []
+    for row in x:
+        ranks, counts, (_, order, starts) = value_ranks(row, weights)
+        sum_x = (ranks * counts).sum(axis=1)
+        variance_x = n * (ranks * ranks * counts).sum(axis=1) - sum_x ** 2
+        sum_xy = (ranks * np.add.reduceat(weighted_y[:, order], starts, axis=1)).sum(axis=1)
+        correlations.append((n * sum_xy - sum_x * sum_y) / np.sqrt(variance_x * variance_y))
+    return np.stack(correlations)
+
+
+def weighted_correlations(x: np.ndarray, y: np.ndarray, weights: np.ndarray, method: str = "pearson") -> np.ndarray:
+    """
+    :param method: pearson, or spearman for the Pearson correlation of the ranks within every resample
+    :return: (number of variables, number of resamples)
+    """
+    if method == "pearson":
+        return weighted_pearson(x, y, weights)
+    return weighted_spearman(x, y, weights)
+
+
+class Bootstrap:
+    """
+    Bootstrap confidence intervals and permutation tests of the statistics of a list of items,
+    like the correlations of the wordiness of the cognitive words with the human measurements.
+    The resamples are drawn as matrices, the number of times every item is drawn by every resample,
+    so the statistic of all the resamples and of all the tokenizers is computed by a few matrix products.
+    The resamples only depend on the seed, the stream and the number of items, so the resamples of the same
+    word list are the same for every tokenizer and the differences between tokenizers are paired.
+    """
+
+    def __init__(self, num_of_resamples: int = 1000, confidence: float = 0.95, seed: int = 0):
+        self.num_of_resamples = num_of_resamples
+        self.confidence = confidence
+        self.seed = seed
+
+    def key(self) -> str:
+        # identifies the settings in the results store
+        return f"bootstrap {self.num_of_resamples} {self.confidence} {self.seed}"
+
+    def rng(self, stream: str):
+        # an independent stream of random numbers for every list of items
+        return np.random.default_rng([self.seed, zlib.crc32(stream.encode("utf-8"))])
+
+    def batch_size(self, num_of_items: int) -> int:
+        return max(1, min(self.num_of_resamples, BATCH_ELEMENTS // max(num_of_items, 1)))
+
+    def weights(self, num_of_items: int, stream: str):
+        """
+        :return: batches of the number of times every item is drawn, of shape (batch size, number of items)
+        """
+        rng = self.rng(stream)
+        batch_size = self.batch_size(num_of_items)
+        for start in range(0, self.num_of_resamples, batch_size):
+            size = min(batch_size, self.num_of_resamples - start)
+            draws = rng.integers(0, num_of_items, size=(size, num_of_items))
+            draws += np.arange(size)[:, None] * num_of_items
+            yield np.bincount(draws.ravel(), minlength=size * num_of_items).reshape(size, -1).astype(np.float64)
+
+    def correlations(self, x: np.ndarray, y: np.ndarray, stream: str, method: str = "pearson") -> np.ndarray:
+        """
+        :param x: (number of variables, number of items)
+        :return: (number of variables, number of resamples), the correlation of every variable with y
+        in every bootstrap resample
+        """
+        return np.concatenate([weighted_correlations(x, y, weights, method)
+                               for weights in self.weights(len(y), stream)], axis=1)
+
+    def permutation_pvalues(self, x: np.ndarray, y: np.ndarray, stream: str, method: str = "pearson") -> np.ndarray:
+        """
+        :return: (number of variables,), the two-sided p-value of the correlation of every variable with y,
+        the share of the permutations of y whose correlation is at least as strong
+        """
+        rng = self.rng(f"{stream} permutations")
+        ones = np.ones((1, len(y)))
+        observed = np.abs(weighted_correlations(x, y, ones, method)[:, 0])
+        if method == "spearman":
+            x = np.stack([resample_ranks(row, ones)[0] for row in x])
+            y = resample_ranks(y, ones)[0]
+        # the correlation with a permutation of y is the correlation of standardized vectors, a matrix product
+        x = (x - x.mean(axis=1, keepdims=True)) / x.std(axis=1, keepdims=True)
+        y = (y - y.mean()) / y.std()
+        as_strong = np.zeros(len(x), dtype=np.int64)
+        batch_size = self.batch_size(len(y))
+        for start in range(0, self.num_of_resamples, batch_size):
+            size = min(batch_size, self.num_of_resamples - start)
+            permuted = y[rng.permuted(np.tile(np.arange(len(y)), (size, 1)), axis=1)]
+            permuted_correlations = x @ permuted.T / len(y)
+            # a relative tolerance for the permutations which reproduce the observed correlation
+            as_strong += (np.abs(permuted_correlations) >= observed[:, None] * (1 - 1e-12)).sum(axis=1)
+        return (as_strong + 1) / (self.num_of_resamples + 1)
+
+    def interval(self, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # the percentile interval of the resampled values along the last axis, which stays within [-1, 1]
+        # for correlations
+        alpha = (1 - self.confidence) / 2
+        low, high = np.quantile(values, [alpha, 1 - alpha], axis=-1)
+        return low, high
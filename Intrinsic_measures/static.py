@@ -1,18 +1,129 @@
-from typing import List, Union
-import tokenization_scorer
+from collections import Counter
+from typing import Iterable, List
+import numpy as np
+from utils import HFEncoding
+from Intrinsic_measures.registry import register
 
+# the order of the Rényi efficiency of the entropy score
+ENTROPY_POWER = 2.5
+# the mapping between bytes and the characters of the vocabularies of the byte level tokenizers
+BYTE_ENCODING = HFEncoding()
 
-def encode_corpus(tokenizer, corpus: List[str]) -> dict[str:float]:
+
+class TokenFrequencies:
+    """
+    A running token -> count table of a tokenized corpus.
+    It can be fed chunk by chunk and merged across workers, so memory scales with the number of distinct tokens
+    rather than with the size of the corpus.
+    """
+
+    def __init__(self, counts: dict[str, int] | None = None):
+        self.counts = Counter(counts or {})
+
+    def update(self, tokenized_sentences: Iterable[List[str]]):
+        for tokens in tokenized_sentences:
+            self.counts.update(tokens)
+        return self
+
+    def add(self, token: str, count: int = 1):
+        self.counts[token] += count
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        return self
+
+    def num_of_tokens(self) -> int:
+        return sum(self.counts.values())
+
+    def num_of_bytes(self) -> int:
+        # the number of bytes the tokens of a byte level tokenizer stand for
+        return sum(len(BYTE_ENCODING.tobytes(token)) * count for token, count in self.counts.items())
+
+    def renyi_efficiency(self, power: float) -> float:
+        """
+        The Rényi efficiency of the token distribution, as computed by tokenization_scorer.score(..., power=power)
+        """
+        # tokenization_scorer splits every token on whitespace and drops the empty pieces
+        piece_counts = Counter()
+        for token, count in self.counts.items():
+            if count <= 0:
+                continue
+            for piece in token.split():
+                piece_counts[piece] += count
+        freqs = np.sort(np.fromiter(piece_counts.values(), dtype=np.float64, count=len(piece_counts)))[::-1]
+        probs = freqs / freqs.sum()
+        vocab_size = len(probs)
+        if power == 1.0:
+            return -np.sum(probs * np.log2(probs)) / np.log2(vocab_size)
+        scale = 1 / (1 - power)
+        return scale * np.log2(np.sum(probs ** power)) / np.log2(vocab_size)
+
+
+def renyi_efficiencies(frequencies: np.ndarray, power: float) -> np.ndarray:
+    """
+    The Rényi efficiency of every row of a matrix of token frequencies, tokens with no occurrences are left out
+    """
+    probs = frequencies / frequencies.sum(axis=1, keepdims=True)
+    vocab_sizes = np.count_nonzero(frequencies, axis=1)
+    if power == 1.0:
+        logs = np.log2(probs, out=np.zeros_like(probs), where=probs > 0)
+        return -np.sum(probs * logs, axis=1) / np.log2(vocab_sizes)
+    scale = 1 / (1 - power)
+    return scale * np.log2(np.sum(probs ** power, axis=1)) / np.log2(vocab_sizes)
+
+
+# the static metrics as statistics of a batch of bootstrap resamples of a sampled corpus
+SAMPLED_STATISTICS = {
+    "fertility": lambda resamples: resamples.num_of_tokens / resamples.num_of_words,
+    "entropy_score": lambda resamples: renyi_efficiencies(resamples.piece_frequencies, ENTROPY_POWER),
+    "bytes_per_token": lambda resamples: resamples.num_of_bytes / resamples.num_of_tokens,
+    "chars_per_token": lambda resamples: resamples.num_of_chars / resamples.num_of_tokens,
+    "byte_fertility": lambda resamples: resamples.num_of_tokens / resamples.num_of_token_bytes,
+}
+# the statistics whose confidence intervals the adaptive sample size targets
+TARGET_STATISTICS = ["fertility", "entropy_score"]
+
+
+@register("fertility", requires=["tokenized_corpus"])
+def encode_corpus(tokenized_corpus) -> dict[str:float]:
+    res = {}
+    res["fertility"] = tokenized_corpus.num_of_tokens() / tokenized_corpus.num_of_words
+    res.update(tokenized_corpus.confidence_interval("fertility"))
+    return res
+
+
+@register("entropy_score", requires=["tokenized_corpus"])
+def entropy_scores(tokenized_corpus) -> dict[str:float]:
+    res = {}
+    res["entropy_score"] = tokenized_corpus.token_frequencies.renyi_efficiency(power=ENTROPY_POWER)
+    res.update(tokenized_corpus.confidence_interval("entropy_score"))
+    return res
+
+
+@register("bytes_per_token", requires=["tokenized_corpus"])
+def bytes_per_token(tokenized_corpus) -> dict[str:float]:
+    res = {}
+    res["bytes_per_token"] = tokenized_corpus.num_of_bytes / tokenized_corpus.num_of_tokens()
+    res.update(tokenized_corpus.confidence_interval("bytes_per_token"))
+    return res
+
+
+@register("chars_per_token", requires=["tokenized_corpus"])
+def chars_per_token(tokenized_corpus) -> dict[str:float]:
     res = {}
-    tokenized_corpus = [tokenizer.tokenize(text) for text in corpus]
-    num_of_tokens = sum([len(tokenized_sentence) for tokenized_sentence in tokenized_corpus])
-    num_of_words = sum(len(sentence.split(" ")) for sentence in corpus)
-    res["fertility"] = num_of_tokens / num_of_words
+    res["chars_per_token"] = tokenized_corpus.num_of_chars / tokenized_corpus.num_of_tokens()
+    res.update(tokenized_corpus.confidence_interval("chars_per_token"))
     return res
 
 
-def entropy_scores(tokenizer, corpus: List[str]) -> dict[str:float]:
+@register("byte_fertility", requires=["tokenized_corpus", "tokenizer"])
+def byte_fertility(tokenized_corpus, tokenizer) -> dict[str:float]:
+    """
+    The number of tokens per byte of the text they stand for, only defined for the byte level tokenizers
+    """
+    if not tokenizer.is_byte_level():
+        return {"byte_fertility": None}
     res = {}
-    tokenized_corpus = [tokenizer.tokenize(text) for text in corpus]
-    res["entropy_score"] = tokenization_scorer.score(tokenized_corpus,power=2.5)
+    res["byte_fertility"] = tokenized_corpus.num_of_tokens() / tokenized_corpus.token_frequencies.num_of_bytes()
+    res.update(tokenized_corpus.confidence_interval("byte_fertility"))
     return res
@@ -1,37 +1,169 @@
-from utils import get_hf_normalizer, get_hf_pretokenizer, load_tokenizer
-from tokenizers import models, normalizers, pre_tokenizers
-import copy
+from utils import get_hf_normalizer, get_hf_pretokenizer, load_tokenizer, file_hash, atomic_write, LRUCache
+from tokenizers import Tokenizer, models, normalizers, pre_tokenizers
+from functools import cached_property
+import os, json, pickle, hashlib
 
+# bumped whenever the layout of the tokenizer snapshots changes
+SNAPSHOT_VERSION = 1
+# bumped whenever the sub-vocabularies of the configs change, it is part of their config hash
+SUB_VOCABULARY_VERSION = 2
+# the model types backed by an HF model, which are tokenized in batches by an HF Tokenizer
+BATCHED_TYPES = ["BPE", "WordPiece", "Unigram", "WordLevel", "Sage", "Greedy_Unigram", "Greedy_BPE",
+                 "SaGe_as_Unigram", "Unigram_equal_like", "BPE_equal_like", "SaGe_equal_like", "WP_equal_like"]
 
-class BenchmarkTokenizer:
 
-    def __init__(self, config_filepath):
-        self.config = load_tokenizer(config_filepath)
-        self.normalizer = BenchmarkNormalizer(self.config['normalizer'])
-        self.pre_tokenizer = BenchmarkPreTokenizer(self.config['pre_tokenizer'])
-        self.model = BenchmarkModel(self.config['model'])
+class BenchmarkTokenizer:
 
-        model_config = self.config['model']
-        self.type = model_config['type']
-        if isinstance(model_config['vocab'], dict):
-            self.vocab: dict[bytes:int] = model_config['vocab']
-        elif isinstance(model_config['vocab'], list):
-            # this is the case of a unigram based vocab where each inner list is (token,likelihood)
-            self.vocab = {ls[0]: idx for idx, ls in enumerate(model_config['vocab'])}
-        self.inv_vocab: dict[int:bytes] = {idx: token for token, idx in self.vocab.items()}
+    def __init__(self, config_filepath, snapshot_dir=None, cache_size=0, max_vocab_size=None):
+        """
+        :param snapshot_dir: a directory for the compiled snapshots of the tokenizer configs, keyed by the hash
+        of the config file. A snapshot skips parsing the JSON config and preparing the model.
+        :param cache_size: the number of tokenized pre-tokens, and of tokenized texts, the tokenizer keeps in memory
+        so repeated words are only tokenized once. 0 disables the caches, they are never used by non-deterministic
+        tokenizers (BPE dropout) which sample a new segmentation on every call. The corpus bypasses the caches,
+        its word types (and its texts, when tokenized in batches) are tokenized once.
+        :param max_vocab_size: restrict the vocabulary of the config to its first max_vocab_size entries,
+        see sub_vocabulary_config
+        """
+        self.config_filepath = config_filepath
+        self.max_vocab_size = max_vocab_size
+        self.file_hash = file_hash(config_filepath)
+        self.config_hash = self.file_hash
+        if max_vocab_size is not None:
+            # every sub-vocabulary of a config is a tokenizer of its own in the caches and the results store
+            self.config_hash = hashlib.sha256(
+                f"{self.file_hash} {max_vocab_size} v{SUB_VOCABULARY_VERSION}".encode("utf-8")).hexdigest()
+        snapshot_path = None
+        if snapshot_dir:
+            file_name = f"{self.config_hash[:16]}-tokenizer-v{SNAPSHOT_VERSION}.pkl"
+            snapshot_path = os.path.join(snapshot_dir, file_name)
+        if snapshot_path and os.path.exists(snapshot_path):
+            with open(snapshot_path, 'rb') as snapshot_file:
+                snapshot = pickle.load(snapshot_file)
+            self.model = BenchmarkModel.from_snapshot(snapshot['model'])
+        else:
+            config = self.load_config()
+            self.model = BenchmarkModel(config['model'])
+            snapshot = {"normalizer": config['normalizer'], "pre_tokenizer": config['pre_tokenizer'],
+                        "vocab": get_vocab_ids(config['model']['vocab']), "model": self.model.snapshot()}
+            if snapshot_path:
+                os.makedirs(snapshot_dir, exist_ok=True)
+                with atomic_write(snapshot_path) as snapshot_file:
+                    pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.normalizer = BenchmarkNormalizer(snapshot['normalizer'])
+        self.pre_tokenizer = BenchmarkPreTokenizer(snapshot['pre_tokenizer'])
+        # identifies the normalizer and the pre-tokenizer, the tokenizers which share them pre-tokenize alike
+        self.pre_tokenization_hash = hashlib.sha256(
+            json.dumps([snapshot['normalizer'], snapshot['pre_tokenizer']], sort_keys=True).encode("utf-8")).hexdigest()
+        self.type = self.model.type
+        self.vocab: dict[bytes:int] = vocabularies.share(snapshot['vocab'])
         self.vocab_size = len(self.vocab)
-
-    def tokenize(self, text):
+        self.word_cache = None
+        self.text_cache = None
+        if cache_size and self.is_deterministic():
+            self.word_cache = LRUCache(cache_size)
+            self.text_cache = LRUCache(cache_size)
+
+    @cached_property
+    def config(self):
+        return self.load_config()
+
+    def load_config(self):
+        config = load_config(self.config_filepath, self.file_hash)
+        if self.max_vocab_size is None:
+            return config
+        added_tokens = config.get('added_tokens') or []
+        model_config = sub_vocabulary_config(config['model'], self.max_vocab_size, added_tokens)
+        vocab = get_vocab_ids(model_config['vocab'])
+        # the ids of the added tokens follow the renumbering of the sub-vocabulary
+        added_tokens = [dict(added_token, id=vocab[added_token['content']]) if added_token['content'] in vocab
+                        else added_token for added_token in added_tokens]
+        return dict(config, model=model_config, added_tokens=added_tokens)
+
+    @cached_property
+    def inv_vocab(self) -> dict[int:bytes]:
+        return {idx: token for token, idx in self.vocab.items()}
+
+    def pre_tokenize(self, text):
         normalized_text = self.normalizer.normalize_str(text)
         pre_tokenized_text = self.pre_tokenizer.pre_tokenize_str(normalized_text)
+        return [word for word, offset in pre_tokenized_text]
+
+    def tokenize_word(self, word):
+        if self.word_cache is None:
+            return self.tokenize_word_uncached(word)
+        # the cached tokens are tuples, so callers modifying the returned list never modify the cache
+        return list(self.word_cache.get(word, lambda word: tuple(self.tokenize_word_uncached(word))))
+
+    def tokenize_word_uncached(self, word):
+        # tokenize a single pre-token with the model
+        return [tok.value for tok in self.model.tokenize(word)]
+
+    def tokenize(self, text):
+        if self.text_cache is None:
+            return self.tokenize_text(text)
+        return list(self.text_cache.get(text, lambda text: tuple(self.tokenize_text(text))))
+
+    def tokenize_text(self, text):
         tokens = []
-        for word, offset in pre_tokenized_text:
-            tokens.extend(map(lambda tok: tok.value, self.model.tokenize(word)))
-        if self.get_type() == "WP_equal_like":
+        for word in self.pre_tokenize(text):
+            tokens.extend(self.tokenize_word(word))
+        if self.get_type() == "WP_equal_like" and tokens:
             tokens = list(map(lambda tok: "##" + tok, tokens))
             tokens[0] = tokens[0][2:]
         return tokens
 
+    @cached_property
+    def backend_tokenizer(self):
+        """
+        The whole tokenization pipeline as a single HF Tokenizer, for the model types backed by an HF model,
+        or None for the python models (and for configs without a pre-tokenizer, which are split on whitespace)
+        """
+        if self.get_type() not in BATCHED_TYPES or self.pre_tokenizer.backend_pretokenizer is None:
+            return None
+        backend_tokenizer = Tokenizer(self.model.backend_model)
+        if self.normalizer.backend_normalizer:
+            backend_tokenizer.normalizer = self.normalizer.backend_normalizer
+        backend_tokenizer.pre_tokenizer = self.pre_tokenizer.backend_pretokenizer
+        return backend_tokenizer
+
+    def encode_batch(self, texts):
+        # normalize, pre-tokenize and tokenize the texts in parallel in rust
+        return self.backend_tokenizer.encode_batch(texts, add_special_tokens=False)
+
+    def tokenize_batch(self, texts):
+        """
+        The tokens of every text, the same as tokenize
+        """
+        if self.backend_tokenizer is None:
+            return [self.tokenize(text) for text in texts]
+        if self.text_cache is None:
+            return self.tokenize_batch_uncached(texts)
+        # only the texts missing from the cache are encoded, in a single batch
+        cached = [self.text_cache.lookup(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, tokens in zip(texts, cached) if tokens is None))
+        computed = dict(zip(missing, self.tokenize_batch_uncached(missing))) if missing else {}
+        for text, tokens in computed.items():
+            self.text_cache.put(text, tuple(tokens))
+        return [list(tokens) if tokens is not None else list(computed[text]) for text, tokens in zip(texts, cached)]
+
+    def tokenize_batch_uncached(self, texts):
+        tokenized = [encoding.tokens for encoding in self.encode_batch(texts)]
+        if self.get_type() == "WP_equal_like":
+            tokenized = [[tokens[0]] + ["##" + token for token in tokens[1:]] if tokens else tokens
+                         for tokens in tokenized]
+        return tokenized
+
+    def cache_stats(self) -> dict | None:
+        if self.word_cache is None:
+            return None
+        return {"words": self.word_cache.stats(), "texts": self.text_cache.stats()}
+
+    def clear_caches(self):
+        if self.word_cache is not None:
+            self.word_cache.clear()
+            self.text_cache.clear()
+
     def get_vocab(self):
         return self.vocab
 
@@ -41,6 +173,130 @@ class BenchmarkTokenizer:
     def get_type(self):
         return self.model.type
 
+    def is_deterministic(self):
+        # BPE dropout samples a different segmentation on every call
+        return self.get_type() != "BPE_dropout"
+
+    def keeps_unknown_pieces(self):
+        # the Unigram models tokenize the unknown pieces as themselves, all with the id of the unknown token
+        return isinstance(self.model.backend_model, models.Unigram)
+
+
+def vocab_hash(vocab: dict) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update("\x00".join(vocab).encode("utf-8"))
+    digest.update(str(list(vocab.values())).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class VocabularyRegistry:
+    """
+    One instance of every distinct vocabulary, detected by the hash of its content, and of the tries built over it.
+    Tokenizers which only differ by their inference method share the vocabulary instead of holding their own copy.
+    The shared structures are never mutated. Filled before the process pool starts, they are inherited by the
+    forked workers copy-on-write.
+    """
+
+    def __init__(self):
+        self.vocabs = {}
+        # the hash of every shared vocabulary by its id, the shared vocabularies are never freed so ids are stable
+        self.keys = {}
+        self.tries = {}
+
+    def share(self, vocab: dict) -> dict:
+        key = vocab_hash(vocab)
+        shared = self.vocabs.setdefault(key, vocab)
+        self.keys[id(shared)] = key
+        return shared
+
+    def trie(self, vocab: dict, kind: str, build):
+        """
+        :param kind: identifies the trie among the tries built over the vocabulary
+        :param build: builds the trie when it is not shared yet
+        """
+        key = self.keys.get(id(vocab))
+        if key is None:
+            return build()
+        if (key, kind) not in self.tries:
+            self.tries[(key, kind)] = build()
+        return self.tries[(key, kind)]
+
+
+vocabularies = VocabularyRegistry()
+
+
+# the last parsed config, the sub-vocabularies of a config are loaded one after the other
+parsed_config = {}
+
+
+def load_config(config_filepath, config_hash):
+    if parsed_config.get("hash") != config_hash:
+        parsed_config.update(hash=config_hash, config=load_tokenizer(config_filepath))
+    return parsed_config["config"]
+
+
+def config_vocab_size(config_filepath) -> int:
+    # the size of the whole vocabulary of a tokenizer config
+    return len(load_config(config_filepath, file_hash(config_filepath))['model']['vocab'])
+
+
+def sub_vocabulary_config(model_config, vocab_size, added_tokens=()):
+    """
+    The model config restricted to the vocab_size entries of its vocabulary with the lowest ids.
+    The BPE and WordPiece trainers append every new entry to the vocabulary and the Unigram vocabularies are sorted
+    by score, so the first entries are the vocabulary of a smaller tokenizer: for BPE the entries up to a merge rank,
+    which only keeps the merges whose parts and result are kept.
+    The unknown token and the added tokens are always kept, within the vocab_size entries, and the kept entries
+    are renumbered in order so the ids (and the unk_id of Unigram) stay those of a vocabulary of their size.
+    :param added_tokens: the added_tokens of the tokenizer config
+    """
+    model_config = dict(model_config)
+    vocab = model_config['vocab']
+    if isinstance(vocab, dict):
+        tokens = [token for token, idx in sorted(vocab.items(), key=lambda item: item[1])]
+        unk_token = model_config.get('unk_token')
+    else:
+        tokens = [entry[0] for entry in vocab]
+        unk_id = model_config.get('unk_id')
+        unk_token = tokens[unk_id] if unk_id is not None else None
+    special = {added_token['content'] for added_token in added_tokens}
+    if unk_token is not None:
+        special.add(unk_token)
+    special &= set(tokens)
+    # the regular entries fill the rest of the vocab_size entries
+    budget = max(vocab_size - len(special), 0)
+    kept = []
+    for idx, token in enumerate(tokens):
+        if token in special:
+            kept.append(idx)
+        elif budget > 0:
+            kept.append(idx)
+            budget -= 1
+    if isinstance(vocab, dict):
+        model_config['vocab'] = {tokens[idx]: new_idx for new_idx, idx in enumerate(kept)}
+    else:
+        model_config['vocab'] = [vocab[idx] for idx in kept]
+        if unk_id is not None:
+            model_config['unk_id'] = kept.index(unk_id)
+    if 'merges' in model_config:
+        sub_vocab = model_config['vocab']
+        prefix = model_config.get('continuing_subword_prefix') or ""
+
+        def kept_merge(merge):
+            first, second = merge.split(" ")
+            merged = first + (second[len(prefix):] if prefix and second.startswith(prefix) else second)
+            return first in sub_vocab and second in sub_vocab and merged in sub_vocab
+
+        model_config['merges'] = [merge for merge in model_config['merges'] if kept_merge(merge)]
+    return model_config
+
+
+def get_vocab_ids(vocab):
+    if isinstance(vocab, dict):
+        return vocab
+    # this is the case of a unigram based vocab where each inner list is (token,likelihood)
+    return {ls[0]: idx for idx, ls in enumerate(vocab)}
+
 
 class BenchmarkNormalizer:
 
@@ -105,7 +361,8 @@ class BenchmarkModel:
 
     def __init__(self, model_config):
         self.type = model_config['type']
-        model_config = copy.deepcopy(model_config)
+        # only the top level entries are replaced, the nested values of the config are never mutated
+        model_config = dict(model_config)
         match model_config.pop('type'):
             case 'BPE':
                 model_config['merges'] = tuple(tuple(s.split(" ")) for s in model_config['merges'])
@@ -154,101 +411,202 @@ class BenchmarkModel:
                 if isinstance(model_config['vocab'], list):
                     vocab = tuple(tuple(ls) for ls in model_config['vocab'])
                     model_config["vocab"] = {tok[0]: i for i, tok in enumerate(vocab)}
-                self.backend_model = FlotaTokenizer(model_config["vocab"])
+                self.backend_model = FlotaTokenizer(vocabularies.share(model_config["vocab"]))
             case 'WP_flota':
                 # unigram
                 if isinstance(model_config['vocab'], list):
                     vocab = tuple(tuple(ls) for ls in model_config['vocab'])
                     model_config["vocab"] = {tok[0]: i for i, tok in enumerate(vocab)}
-                self.backend_model = FlotaTokenizer(model_config["vocab"], special="##")
+                self.backend_model = FlotaTokenizer(vocabularies.share(model_config["vocab"]), special="##")
             case 'longest_suffix':
                 if isinstance(model_config['vocab'], list):
                     vocab = tuple(tuple(ls) for ls in model_config['vocab'])
                     model_config["vocab"] = {tok[0]: i for i, tok in enumerate(vocab)}
-                self.backend_model = LongestSuffix(model_config["vocab"])
+                self.backend_model = LongestSuffix(vocabularies.share(model_config["vocab"]))
             case 'WP_longest_suffix':
                 if isinstance(model_config['vocab'], list):
                     vocab = tuple(tuple(ls) for ls in model_config['vocab'])
                     model_config["vocab"] = {tok[0]: i for i, tok in enumerate(vocab)}
-                self.backend_model = LongestSuffix(model_config["vocab"], special="##")
+                self.backend_model = LongestSuffix(vocabularies.share(model_config["vocab"]), special="##")
 
     def tokenize(self, sequence):
         return self.backend_model.tokenize(sequence)
 
+    def prepare(self):
+        # build the lazily built structures of the model ahead of its first use
+        if isinstance(self.backend_model, FlotaTokenizer):
+            self.backend_model.trie, self.backend_model.continuation_trie
+        elif isinstance(self.backend_model, LongestSuffix):
+            self.backend_model.reversed_trie
+
+    def snapshot(self) -> dict:
+        """
+        The prepared model in a form that loads faster than its config:
+        the HF models in their own serialization, read back by the rust backend,
+        and the vocabulary of the python models, whose tries are built on first use
+        """
+        if isinstance(self.backend_model, (FlotaTokenizer, LongestSuffix)):
+            return {"type": self.type, "vocab": self.backend_model.vocab, "special": self.backend_model.special}
+        return {"type": self.type, "backend": Tokenizer(self.backend_model).to_str()}
+
+    @staticmethod
+    def from_snapshot(snapshot: dict):
+        model = BenchmarkModel.__new__(BenchmarkModel)
+        model.type = snapshot['type']
+        if "backend" in snapshot:
+            model.backend_model = Tokenizer.from_str(snapshot['backend']).model
+        elif model.type in ('flota', 'WP_flota'):
+            model.backend_model = FlotaTokenizer(vocabularies.share(snapshot['vocab']), special=snapshot['special'])
+        else:
+            model.backend_model = LongestSuffix(vocabularies.share(snapshot['vocab']), special=snapshot['special'])
+        return model
+
+
+# marks the end of a vocabulary entry in a trie node
+END_OF_TOKEN = ""
+# FLOTA masks the characters of every subword it emits
+MASK = "\u2581"
+
+
+def build_trie(tokens):
+    trie = {}
+    for token in tokens:
+        node = trie
+        for char in token:
+            node = node.setdefault(char, {})
+        node[END_OF_TOKEN] = True
+    return trie
+
 
 class FlotaTokenizer:
+    """
+    FLOTA: repeatedly emit the longest subword of the word that is in the vocabulary (leftmost on ties),
+    masking its characters, until the word is fully masked or no subword matches.
+    The longest match from every start position is found by walking a prefix trie over the vocabulary,
+    and after each emitted subword only the start positions whose walk reached the masked span are updated.
+    """
+
     def __init__(self, vocab, special="Ġ"):
         self.vocab = vocab
         self.special = special
 
-    def max_subword_split(self, w):
-        for l in range(len(w), 0, -1):
-            for i in range(0, len(w) - l + 1):
-                if w[i] == "\u2581":
-                    continue
-                subword = w[i:i + l]
-                if self.special == "Ġ":
-                    if subword in self.vocab:
-                        return subword, w[:i] + l * "\u2581" + w[i + l:], i
-                else:
-                    if i == 0:
-                        if subword in self.vocab:
-                            return subword, w[:i] + l * "\u2581" + w[i + l:], i
-                    else:
-                        if (self.special + subword) in self.vocab:
-                            return self.special + subword, w[:i] + l * "\u2581" + w[i + l:], i
-        return None, None, None
-
-    def get_flota_dict(self, w):
-        max_subword, rest, i = self.max_subword_split(w)
-        if max_subword is None:
-            return dict()
-        if rest == len(rest) * "\u2581":
-            flota_dict = {i: max_subword}
-            return flota_dict
-        flota_dict = self.get_flota_dict(rest)
-        flota_dict[i] = max_subword
-        return flota_dict
+    @cached_property
+    def trie(self):
+        return vocabularies.trie(self.vocab, "prefix", lambda: build_trie(self.vocab))
+
+    @cached_property
+    def continuation_trie(self):
+        if self.special == "Ġ":
+            return self.trie
+        # subwords which do not start the word are looked up with the continuation prefix
+        return vocabularies.trie(self.vocab, f"continuation {self.special}", lambda: build_trie(
+            token[len(self.special):] for token in self.vocab if token.startswith(self.special)))
+
+    def longest_match(self, chars, i):
+        """
+        Walk the trie from position i
+        :return: the length of the longest vocabulary entry starting at i, and the position where the walk stopped
+        """
+        node = self.trie if i == 0 else self.continuation_trie
+        length = 0
+        j = i
+        while j < len(chars):
+            node = node.get(chars[j])
+            if node is None:
+                break
+            j += 1
+            if END_OF_TOKEN in node:
+                length = j - i
+        return length, j
 
     def tokenize(self, w):
-        flota_dict = self.get_flota_dict(w)
-        return [Token(subword) for i, subword in sorted(flota_dict.items())]
+        chars = list(w)
+        lengths = [0] * len(chars)
+        reaches = [0] * len(chars)
+        for i in range(len(chars)):
+            if chars[i] != MASK:
+                lengths[i], reaches[i] = self.longest_match(chars, i)
+        subwords = {}
+        while True:
+            length = max(lengths, default=0)
+            if length == 0:
+                break
+            i = lengths.index(length)
+            subword = "".join(chars[i:i + length])
+            if self.special != "Ġ" and i > 0:
+                subword = self.special + subword
+            subwords[i] = subword
+            for j in range(i, i + length):
+                chars[j] = MASK
+                lengths[j] = 0
+            if all(char == MASK for char in chars):
+                break
+            # the masked characters can only change the matches of walks which reached them
+            for j in range(i):
+                if chars[j] != MASK and reaches[j] >= i:
+                    lengths[j], reaches[j] = self.longest_match(chars, j)
+        return [Token(subword) for i, subword in sorted(subwords.items())]
 
 
 class LongestSuffix:
+    """
+    Greedy longest suffix: repeatedly emit the longest suffix of the word that is in the vocabulary,
+    until the word is consumed or no suffix matches.
+    Suffixes are matched by walking a trie of the reversed vocabulary backwards from the end of the word.
+    """
+
     def __init__(self, vocab, special="Ġ"):
         self.vocab = vocab
         self.special = special
 
+    @cached_property
+    def reversed_trie(self):
+        if self.special == "Ġ":
+            tokens = self.vocab
+        else:
+            # suffixes which do not start the word are looked up with the continuation prefix
+            tokens = (token[len(self.special):] for token in self.vocab if token.startswith(self.special))
+        return vocabularies.trie(self.vocab, f"reversed {self.special}",
+                                 lambda: build_trie(token[::-1] for token in tokens))
+
+    def longest_suffix(self, w, end):
+        """
+        :return: the start of the longest vocabulary entry ending at end, or None if there is no such entry
+        """
+        if self.special != "Ġ" and w[:end] in self.vocab:
+            # the whole remaining word is looked up without the continuation prefix
+            return 0
+        lowest = 0 if self.special == "Ġ" else 1
+        node = self.reversed_trie
+        start = None
+        j = end
+        while j > lowest:
+            node = node.get(w[j - 1])
+            if node is None:
+                break
+            j -= 1
+            if END_OF_TOKEN in node:
+                start = j
+        return start
+
     def tokenize(self, w):
         tokens = []
-        i = 0
-        while w and i < len(w):
-            if self.special == "Ġ":
-                if w[i:] in self.vocab:
-                    tokens.insert(0, w[i:])
-                    w = w[:i]
-                    i = 0
-                else:
-                    i += 1
-            else:
-                if i == 0:
-                    if w[i:] in self.vocab:
-                        tokens.insert(0, w[i:])
-                        w = w[:i]
-                        i = 0
-                    else:
-                        i += 1
-                else:
-                    if self.special + w[i:] in self.vocab:
-                        tokens.insert(0, self.special + w[i:])
-                        w = w[:i]
-                        i = 0
-                    else:
-                        i += 1
+        end = len(w)
+        while end > 0:
+            start = self.longest_suffix(w, end)
+            if start is None:
+                break
+            token = w[start:end]
+            if self.special != "Ġ" and start > 0:
+                token = self.special + token
+            tokens.append(token)
+            end = start
+        tokens.reverse()
         return [Token(token) for token in tokens]
 
 
 class Token:
+    __slots__ = ("value",)
+
     def __init__(self, subword):
         self.value = subword
@@ -0,0 +1,272 @@
+"""
+Throughput benchmark of the inference methods of BenchmarkModel.
+
+Synthetic BPE, WordPiece and Unigram tokenizers are trained on a generated corpus at several vocabulary sizes,
+and every model type is derived from them as a tokenizer JSON config, the same way the benchmark configs are.
+For every model type and vocabulary size the script measures words/sec, tokens/sec and the peak memory of loading
+the tokenizer and tokenizing the words, per word length bucket.
+Every bucket is tokenized repeatedly for at least --min_seconds per repetition and the median repetition is kept,
+so the timer and scheduler noise stays well below the tolerance.
+Results are written as JSON and compared against a baseline stored on the same machine to catch regressions.
+
+Example:
+    python benchmarks/inference_benchmark.py --save_baseline
+    python benchmarks/inference_benchmark.py --types flota WP_flota
+"""
+import argparse, copy, json, os, platform, random, statistics, sys, tempfile, time, tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tokenizers
+from tokenizers import Tokenizer, models, normalizers, pre_tokenizers, trainers
+import benchmark_objects
+from benchmark_objects import BenchmarkTokenizer
+from profiling import proc_status, reset_peak_rss
+
+RESULTS = "inference_benchmark.json"
+# throughput is machine specific, the baseline is stored by every machine for itself
+BASELINE = "inference_benchmark_baseline.json"
+
+MODEL_TYPES = ["BPE", "BPE_dropout", "WordPiece", "Unigram", "WordLevel", "Sage", "Greedy_Unigram", "Greedy_BPE",
+               "SaGe_as_Unigram", "Unigram_equal_like", "BPE_equal_like", "SaGe_equal_like", "WP_equal_like",
+               "flota", "WP_flota", "longest_suffix", "WP_longest_suffix"]
+# the family of trained tokenizer every model type is derived from
+FAMILIES = {"BPE": "bpe", "BPE_dropout": "bpe", "Greedy_BPE": "bpe", "BPE_equal_like": "bpe", "flota": "bpe",
+            "longest_suffix": "bpe", "WordLevel": "bpe",
+            "WordPiece": "wordpiece", "Sage": "wordpiece", "WP_equal_like": "wordpiece", "WP_flota": "wordpiece",
+            "WP_longest_suffix": "wordpiece",
+            "Unigram": "unigram", "Greedy_Unigram": "unigram", "SaGe_as_Unigram": "unigram",
+            "Unigram_equal_like": "unigram", "SaGe_equal_like": "unigram"}
+# the model types implemented in python, the others are HF models whose memory is allocated by the rust backend
+PYTHON_TYPES = ["flota", "WP_flota", "longest_suffix", "WP_longest_suffix"]
+# word length buckets in characters, as (name, shortest, longest)
+BUCKETS = [("1-4", 1, 4), ("5-8", 5, 8), ("9-16", 9, 16), ("17+", 17, None)]
+
+
+def load_args():
+    parser = argparse.ArgumentParser(description="Throughput benchmark of the tokenizer inference methods")
+    parser.add_argument("--vocab_sizes", type=int, nargs="+", default=[1000, 4000, 16000])
+    parser.add_argument("--types", nargs="+", default=MODEL_TYPES, choices=MODEL_TYPES,
+                        help="The model types to benchmark")
+    parser.add_argument("--words", type=int, default=2000, help="The number of words per length bucket")
+    parser.add_argument("--repeats", type=int, default=5, help="Timing repetitions, the median one is kept")
+    parser.add_argument("--min_seconds", type=float, default=0.2,
+                        help="The minimal wall time of a repetition, the words are tokenized as many times as needed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=RESULTS, help="Where to write the results")
+    parser.add_argument("--baseline", default=BASELINE, help="The stored results to compare against")
+    parser.add_argument("--save_baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="The relative drop in words/sec reported as a regression")
+    return vars(parser.parse_args())
+
+
+def synthetic_words(rng, count):
+    # words are built of a Zipf distributed inventory of morphemes, with URL and code like long words
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    morphemes = ["".join(rng.choice(letters) for _ in range(rng.randint(1, 5))) for _ in range(600)]
+    weights = [1 / (rank + 1) for rank in range(len(morphemes))]
+    words = []
+    for _ in range(count):
+        if rng.random() < 0.05:
+            parts = rng.choices(morphemes, weights, k=rng.randint(4, 10))
+            words.append(rng.choice(["https://", "", "self."]) + rng.choice(["/", "_", "."]).join(parts))
+        else:
+            words.append("".join(rng.choices(morphemes, weights, k=rng.randint(1, 4))))
+    return words
+
+
+def train(family, vocab_size, sentences):
+    if family == "bpe":
+        tokenizer = Tokenizer(models.BPE())
+        tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=True)
+        trainer = trainers.BpeTrainer(vocab_size=vocab_size, initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+                                      show_progress=False)
+    elif family == "wordpiece":
+        tokenizer = Tokenizer(models.WordPiece(unk_token="[UNK]"))
+        tokenizer.normalizer = normalizers.BertNormalizer()
+        tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+        trainer = trainers.WordPieceTrainer(vocab_size=vocab_size, special_tokens=["[UNK]"], show_progress=False)
+    else:
+        tokenizer = Tokenizer(models.Unigram())
+        tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=True)
+        trainer = trainers.UnigramTrainer(vocab_size=vocab_size, unk_token="<unk>", special_tokens=["<unk>"],
+                                          initial_alphabet=pre_tokenizers.ByteLevel.alphabet(), show_progress=False)
+    tokenizer.train_from_iterator(sentences, trainer)
+    return json.loads(tokenizer.to_str())
+
+
+def derive_config(model_type, trained):
+    """
+    The tokenizer config of a model type, derived from the trained tokenizer of its family
+    """
+    config = copy.deepcopy(trained)
+    model = config["model"]
+    if model_type in ("BPE", "WordPiece", "Unigram"):
+        return config
+    if model_type == "BPE_dropout":
+        model.update(type=model_type, dropout=0.1)
+    elif model_type in ("Sage", "SaGe_as_Unigram"):
+        model["type"] = model_type
+    elif model_type == "WordLevel":
+        vocab = dict(model["vocab"], **{"<unk>": len(model["vocab"])})
+        config["model"] = {"type": model_type, "vocab": vocab, "unk_token": "<unk>"}
+    elif model_type == "Greedy_BPE":
+        vocab = dict(model["vocab"], **{"<unk>": len(model["vocab"])})
+        config["model"] = {"type": model_type, "vocab": vocab, "unk_token": "<unk>",
+                           "continuing_subword_prefix": "", "max_input_chars_per_word": 100}
+    elif model_type == "Greedy_Unigram":
+        vocab = {token: i for i, (token, score) in enumerate(model["vocab"])}
+        config["model"] = {"type": model_type, "vocab": vocab, "unk_token": "<unk>",
+                           "continuing_subword_prefix": "", "max_input_chars_per_word": 100}
+    elif model_type in ("Unigram_equal_like", "SaGe_equal_like"):
+        model["type"] = model_type
+        model["vocab"] = [[token, 0.0] for token, score in model["vocab"]]
+    elif model_type == "BPE_equal_like":
+        config["model"] = {"type": model_type, "vocab": [[token, 0.0] for token in model["vocab"]], "unk_id": None}
+    elif model_type == "WP_equal_like":
+        # the vocabulary without the continuation prefix, every token with the same likelihood
+        vocab = list(dict.fromkeys(token[2:] if token.startswith("##") else token for token in model["vocab"]))
+        config["model"] = {"type": model_type, "vocab": [[token, 0.0] for token in vocab],
+                           "unk_id": vocab.index("[UNK]")}
+    elif model_type in ("flota", "longest_suffix", "WP_flota", "WP_longest_suffix"):
+        config["model"] = {"type": model_type, "vocab": model["vocab"]}
+    return config
+
+
+def bucket_words(words, pre_tokenize, count, rng):
+    buckets = {name: [] for name, _, _ in BUCKETS}
+    for word in words:
+        for pre_token in pre_tokenize(word):
+            for name, shortest, longest in BUCKETS:
+                if len(pre_token) >= shortest and (longest is None or len(pre_token) <= longest):
+                    buckets[name].append(pre_token)
+    return {name: rng.sample(pre_tokens, min(count, len(pre_tokens))) for name, pre_tokens in buckets.items()}
+
+
+def time_model(model, words, repeats, min_seconds):
+    """
+    :return: the median seconds of tokenizing the words once over the repetitions, and the number of their tokens
+    """
+    timings = []
+    num_of_tokens = 0
+    for _ in range(repeats):
+        passes = 0
+        start = time.perf_counter()
+        while True:
+            num_of_tokens = 0
+            for word in words:
+                num_of_tokens += len(model.tokenize(word))
+            passes += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_seconds:
+                break
+        timings.append(elapsed / passes)
+    return statistics.median(timings), num_of_tokens
+
+
+def peak_memory(config_path, words):
+    """
+    The peak memory of loading the tokenizer and tokenizing the words, measured in a fresh process,
+    since the vocabulary registry of this process already shares the vocabulary and the tries of the tokenizer
+    that was timed
+    :return: the peak of the python allocations, which miss the allocations of the rust backend of the HF models,
+    and the peak RSS of the process above its RSS before loading, which includes them (None where it is not tracked)
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(fresh_peak_memory, config_path, words).result()
+
+
+def fresh_peak_memory(config_path, words):
+    # the config is hashed before tracing starts, the read buffer of the hash is not memory of the tokenizer
+    config_hash = benchmark_objects.file_hash(config_path)
+    benchmark_objects.file_hash = lambda path: config_hash
+    rss_before = reset_peak_rss()
+    tracemalloc.start()
+    tokenizer = BenchmarkTokenizer(config_path)
+    for word in words:
+        tokenizer.model.tokenize(word)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, None if rss_before is None else proc_status("VmHWM") - rss_before
+
+
+def run(args):
+    rng = random.Random(args["seed"])
+    words = synthetic_words(rng, 60000)
+    sentences = [" ".join(words[i:i + 20]) for i in range(0, len(words), 20)]
+    families = {FAMILIES[model_type] for model_type in args["types"]}
+    results = []
+    with tempfile.TemporaryDirectory() as config_dir:
+        for vocab_size in args["vocab_sizes"]:
+            trained = {family: train(family, vocab_size, sentences) for family in families}
+            for model_type in args["types"]:
+                config_path = os.path.join(config_dir, f"{model_type}-{vocab_size}.json")
+                with open(config_path, "w") as config_file:
+                    json.dump(derive_config(model_type, trained[FAMILIES[model_type]]), config_file)
+                start = time.perf_counter()
+                tokenizer = BenchmarkTokenizer(config_path)
+                load_time = time.perf_counter() - start
+                buckets = bucket_words(words, tokenizer.pre_tokenize, args["words"], random.Random(args["seed"]))
+                all_words = [word for bucket in buckets.values() for word in bucket]
+                record = {"model_type": model_type, "vocab_size": vocab_size, "actual_vocab_size": tokenizer.vocab_size,
+                          "load_sec": load_time}
+                for name, bucket in list(buckets.items()) + [("all", all_words)]:
+                    if not bucket:
+                        continue
+                    elapsed, num_of_tokens = time_model(tokenizer.model, bucket, args["repeats"], args["min_seconds"])
+                    traced, rss = peak_memory(config_path, bucket)
+                    results.append(dict(record, bucket=name, words=len(bucket), seconds=elapsed,
+                                        words_per_sec=len(bucket) / elapsed, tokens_per_sec=num_of_tokens / elapsed,
+                                        peak_traced_bytes=traced, peak_rss_bytes=rss))
+                # the rust allocations of the HF models are only seen by the RSS
+                memory = results[-1]["peak_traced_bytes" if model_type in PYTHON_TYPES else "peak_rss_bytes"]
+                print(f"{model_type:>20} {vocab_size:>6}: "
+                      f"{results[-1]['words_per_sec']:>12.0f} words/sec "
+                      f"{results[-1]['tokens_per_sec']:>12.0f} tokens/sec "
+                      f"{(memory or 0) / 2 ** 20:>8.1f} MiB")
+    return {"meta": {"python": platform.python_version(), "tokenizers": tokenizers.__version__,
+                     "machine": platform.machine(), "seed": args["seed"], "words_per_bucket": args["words"],
+                     "repeats": args["repeats"], "min_seconds": args["min_seconds"]},
+            "results": results}
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    :return: the results whose median words/sec dropped by more than the tolerance relative to the baseline
+    """
+    key = lambda record: (record["model_type"], record["vocab_size"], record["bucket"])
+    baseline_records = {key(record): record for record in baseline["results"]}
+    regressions = []
+    for record in results["results"]:
+        if key(record) not in baseline_records:
+            continue
+        ratio = record["words_per_sec"] / baseline_records[key(record)]["words_per_sec"]
+        if ratio < 1 - tolerance:
+            regressions.append((key(record), ratio))
+    return regressions
+
+
+def main():
+    args = load_args()
+    results = run(args)
+    with open(args["output"], "w") as output_file:
+        json.dump(results, output_file, indent=2)
+    if args["save_baseline"]:
+        with open(args["baseline"], "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        return
+    if os.path.exists(args["baseline"]):
+        with open(args["baseline"]) as baseline_file:
+            regressions = compare_to_baseline(results, json.load(baseline_file), args["tolerance"])
+        for (model_type, vocab_size, bucket), ratio in regressions:
+            print(f"Regression: {model_type} vocab {vocab_size} words of length {bucket} "
+                  f"runs at {ratio:.2f}x the baseline words/sec")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,4 +5,27 @@ COMBINED = "Resources/en/ling/combined_resources.csv"
 EN = "Resources/en/cog/en.csv"
 
 # Static Resources
-MINIPILE_TEST = "Resources/en/Static/minipile_test/minipile.txt"
\ No newline at end of file
+MINIPILE_TEST = "Resources/en/Static/minipile_test/minipile.txt"
+# The number of lines read from the corpus at a time
+CORPUS_CHUNK_SIZE = 10000
+# The number of tokenized words, and of tokenized texts, every tokenizer keeps in memory
+TOKENIZATION_CACHE_SIZE = 65536
+
+# The work queue of the sharded corpus, shared by its workers
+QUEUE_DIR = "queue"
+# The seconds after which the claim of a task by a worker which stopped refreshing it is taken for a crash
+CLAIM_TIMEOUT = 300
+
+# Cache of tokenized corpora, keyed by tokenizer config hash and corpus hash
+CACHE_DIR = "cache"
+# Computed metrics, keyed by tokenizer config hash, metric family and resource hash
+RESULTS_DIR = "results"
+
+# Outputs
+OUTPUT = "output.csv"
+# The pairwise segmentation difference matrix of the compare mode
+DIFF_OUTPUT = "segmentation_diff.csv"
+# The paired differences between the cognitive correlations of the tokenizers in the compare mode
+COG_DIFF_OUTPUT = "cognitive_diff.csv"
+# The per tokenizer time and memory breakdown of the --profile flag
+PROFILE_OUTPUT = "profile.json"
@@ -1,98 +1,394 @@
-import os.path, argparse
-import utils
+import os.path, argparse, gc, json, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tqdm import tqdm
-from Intrinsic_measures import static, ling, human_comp, compare
+from Intrinsic_measures import static, ling, human_comp, compare, registry
 import pandas as pd
 from const import *
-from benchmark_objects import BenchmarkTokenizer
+from benchmark_objects import BenchmarkTokenizer, config_vocab_size
+from tokenized_corpus import TokenizedCorpusCache
+from resources import ResourceLoader
+from results_store import ResultsStore
+from sampling import CorpusSampler, SAMPLE_METHODS
+from sharding import WorkQueue, ShardedCorpus
+from Intrinsic_measures.resampling import Bootstrap
+from profiling import Profiler, NullProfiler, instrument
 
 
 def load_args():
     parser = argparse.ArgumentParser(description="Sub-word tokenizers intrinsic benchmark")
     parser.add_argument("--tokenizers", default="tokenizers.txt",
                         help="A path to a txt file containing paths to tokenizers tokenizers")
-    parser.add_argument("--compare",help="A flag for comparing the segmentation difference between the tokenizers" ,action="store_false")
+    parser.add_argument("--compare", action="store_true",
+                        help="A flag for comparing the segmentation difference between the tokenizers")
+    parser.add_argument("--compare_cognitive", action="store_true",
+                        help="A flag for the paired bootstrap tests of the differences between the cognitive "
+                             "correlations of the tokenizers")
+    parser.add_argument("--compare_types", action="store_true",
+                        help="A flag for counting every word type once in the segmentation difference, "
+                             "instead of weighting it by its number of occurrences")
+    parser.add_argument("--metrics", nargs="+", choices=list(registry.METRICS),
+                        help="The metrics to compute, all of them by default")
+    parser.add_argument("--sample", type=int,
+                        help="Estimate the static metrics on a random sample of this many corpus lines, "
+                             "with bootstrap confidence intervals")
+    parser.add_argument("--sample_method", default="reservoir", choices=SAMPLE_METHODS,
+                        help="A uniform sample of the lines, or one line from each of equal blocks of consecutive lines")
+    parser.add_argument("--target_width", type=float,
+                        help="Double the sample until the confidence intervals of fertility and entropy_score "
+                             "are narrower than this width")
+    parser.add_argument("--bootstrap", type=int, default=1000,
+                        help="The number of bootstrap resamples, 0 for no intervals of the cognitive correlations")
+    parser.add_argument("--confidence", type=float, default=0.95, help="The level of the confidence intervals")
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the sample and of the bootstrap")
+    parser.add_argument("--vocab_sizes", type=int, nargs="+",
+                        help="Evaluate every tokenizer restricted to each of these vocabulary sizes, "
+                             "the first entries of its vocabulary by id")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="The number of processes evaluating tokenizers in parallel")
+    parser.add_argument("--corpus_manifest",
+                        help="A txt file listing the shard files of the static corpus, one per line. The shards are "
+                             "tokenized by independent tasks of a work queue and their partial counts are merged")
+    parser.add_argument("--queue_dir", default=QUEUE_DIR,
+                        help="The directory of the work queue of the sharded corpus, shared by all its workers")
+    parser.add_argument("--claim_timeout", type=float, default=CLAIM_TIMEOUT,
+                        help="The seconds after which the task of a worker that stopped refreshing its claim is re-queued")
+    parser.add_argument("--queue_worker", action="store_true",
+                        help="Only run the tasks of the sharded corpus, for additional workers sharing the queue directory")
+    parser.add_argument("--cache_dir", default=CACHE_DIR,
+                        help="A directory for caching tokenized corpora, parsed resources and tokenizer snapshots between runs. "
+                             "Pass an empty string to disable")
+    parser.add_argument("--results_dir", default=RESULTS_DIR,
+                        help="A directory storing the metrics of every tokenizer as soon as they are computed, "
+                             "reruns only compute the missing ones. Pass an empty string to disable")
+    parser.add_argument("--chunk_size", type=int, default=CORPUS_CHUNK_SIZE,
+                        help="The number of corpus lines read and tokenized at a time")
+    parser.add_argument("--tokenization_cache", type=int, default=TOKENIZATION_CACHE_SIZE,
+                        help="The number of tokenized words, and of tokenized texts, every tokenizer keeps in memory "
+                             "so repeated words are tokenized once. Pass 0 to disable")
+    parser.add_argument("--mmap", help="A flag for reading the corpus through a memory map", action="store_true")
+    parser.add_argument("--profile", action="store_true",
+                        help="A flag for writing a per tokenizer time and memory breakdown to profile.json")
     args = vars(parser.parse_args())
     if not args["tokenizers"]:
         parser.error("You must specify the tokenizers path")
+    if args["corpus_manifest"] and args["sample"]:
+        parser.error("--sample is not supported with --corpus_manifest")
+    if args["corpus_manifest"] and args["compare"] and args["compare_types"]:
+        # the word types of the shards overlap, so their counts do not add up to those of the corpus
+        parser.error("--compare_types is not supported with --corpus_manifest")
+    if args["compare_cognitive"] and not args["bootstrap"]:
+        parser.error("--compare_cognitive requires --bootstrap")
+    if args["queue_worker"] and not args["corpus_manifest"]:
+        parser.error("--queue_worker requires --corpus_manifest")
     return args
 
 
-def run_static(tokenizer, corpus):
-    metrics = {}
-    metrics.update(static.encode_corpus(tokenizer, corpus))
-    metrics.update(static.entropy_scores(tokenizer, corpus))
-    return metrics
+def get_tokenized_corpus(tokenizer, cache, resources, sampler, shards):
+    # the corpus is tokenized once (or loaded from the cache) and shared by all the static metrics
+    if sampler:
+        return sampler.sample(tokenizer, MINIPILE_TEST)
+    if shards:
+        return shards.tokenized_corpus(tokenizer)
+    return cache.tokenized_corpus(tokenizer, MINIPILE_TEST)
 
 
-def run_ling(tokenizer, all_tokenizers, vocab, special):
-    metrics = {}
-    metrics.update(
-        ling.combined_coverage(COMBINED, tokenizer, special))
-    return metrics
+# how every prerequisite of the metrics is computed, and the resource file it is computed from
+PREREQUISITES = {
+    "tokenized_corpus": (MINIPILE_TEST, get_tokenized_corpus),
+    "gold_segmentations": (COMBINED, lambda tokenizer, cache, resources, sampler, shards:
+                           resources.gold_segmentations(COMBINED)),
+    "cognitive_data": (EN, lambda tokenizer, cache, resources, sampler, shards: resources.cognitive_data(EN)),
+}
 
 
-def run_human(tokenizer, special, verbose=False):
-    metrics = {}
-    metrics.update(human_comp.eval_cog(EN, tokenizer, special))
-    return metrics
+def run_comp(names, all_tokenizers, special, cache, weighted):
+    return compare.segmentation_diff(names, all_tokenizers, special, cache, MINIPILE_TEST, weighted,
+                                     cache.chunk_size)
 
 
-def run_comp(all_tokenizers, corpus,special):
-    compare.segmentation_diff(all_tokenizers[0], all_tokenizers[1:], corpus,special)
+def get_special(path):
+    file_name = os.path.basename(path)
+    return "##" if (file_name.startswith("wordpiece") or file_name.startswith("flota_wordpiece") or \
+                    file_name.startswith("suffix_wordpiece")) else "Ġ"
 
 
-def eval_tokenizer(tokenizer, all_tokenizers, special, compare):
-    # convert the corpus to a list of strings
-    corpus = utils.corpus_to_list(MINIPILE_TEST)
-    vocab = tokenizer.get_vocab()
+def eval_tokenizer(tokenizer, special, compare, cache, resources, store, selected=None, sampler=None,
+                   profiler=NullProfiler(), bootstrap=None, shards=None):
+    """
+    :param selected: the names of the metrics to compute, all the registered metrics if None
+    :param sampler: a CorpusSampler estimating the static metrics on a sample of the corpus, None for the whole corpus
+    :param bootstrap: a Bootstrap of the confidence intervals of the metrics which take one, None for no intervals
+    :param shards: a ShardedCorpus whose map tasks are done, merged into the tokenized corpus instead of MINIPILE_TEST
+    """
     metrics = {"type": tokenizer.get_type()}
+    scheduled = registry.schedule(selected)
+    remaining = registry.consumers(scheduled)
+    inputs = {"tokenizer": tokenizer, "special": special, "bootstrap": bootstrap}
 
-    # Static metrics
-    metrics.update(run_static(tokenizer, corpus))
+    def get_input(name):
+        # every prerequisite is computed once, on the first metric that is not in the results store
+        if name not in inputs:
+            with profiler.timer(name):
+                inputs[name] = PREREQUISITES[name][1](tokenizer, cache, resources, sampler, shards)
+            if name == "tokenized_corpus":
+                profiler.count_words(name, inputs[name].num_of_words)
+        return inputs[name]
 
-    # Linguistic metrics
-    metrics.update(run_ling(tokenizer, all_tokenizers, vocab, special))
+    for metric in scheduled:
+        prerequisites = registry.prerequisites(metric)
+        # the metrics computed from the tokenizer alone are not computed on a resource
+        resource_path = PREREQUISITES[prerequisites[0]][0] if prerequisites else None
 
-    # human metrics
-    metrics.update(run_human(tokenizer, special))
+        def compute():
+            args = [get_input(name) for name in metric.requires]
+            with profiler.timer(metric.name):
+                return metric.compute(*args)
 
-    # comparative measures
-    if compare and tokenizer == all_tokenizers[0]:
-        # This function doesn't return a value and just prints the segmentation difference once
-        # This counts on the fact that the vocabulary is the same for all tokenizers
-        # And that the default inference is the first tokenizer
-        run_comp(all_tokenizers, corpus,special)
+        variant = special if "special" in metric.requires else ""
+        if sampler and "tokenized_corpus" in metric.requires:
+            variant += sampler.key()
+        if bootstrap and "bootstrap" in metric.requires:
+            variant += bootstrap.key()
+        if shards and "tokenized_corpus" in metric.requires:
+            # the metrics of a sharded corpus are keyed by its manifest and the content of its shards
+            resource_path = shards.manifest_path
+            variant += shards.key()
+        metrics.update(store.get(tokenizer, metric.name, resource_path, compute, variant))
+        # free the prerequisites no remaining metric consumes
+        for name in prerequisites:
+            remaining[name] -= 1
+            if remaining[name] == 0:
+                inputs.pop(name, None)
+
+    if compare and cache.cache_path(tokenizer, MINIPILE_TEST, "fingerprints", "npy"):
+        # fill the cache with the word segmentations used by the comparative measures
+        with profiler.timer("word_fingerprints"):
+            cache.word_fingerprints(tokenizer, MINIPILE_TEST)
 
     return metrics
 
 
-def main():
-    args = load_args()
-    names = []
-    df = {"tokenizer": names}
-    metrics = []
+# the cache, resources, results store and corpus sampler of a worker process,
+# inherited from the parent process when the workers are forked
+worker_cache = None
+worker_resources = None
+worker_store = None
+worker_sampler = None
+worker_shards = None
+
+
+def init_worker(cache, resources, store, sampler, shards=None):
+    global worker_cache, worker_resources, worker_store, worker_sampler, worker_shards
+    worker_cache = cache
+    worker_resources = resources
+    worker_store = store
+    worker_sampler = sampler
+    worker_shards = shards
+
+
+def get_name(path, vocab_size=None):
+    name = os.path.basename(path).rstrip(".json")
+    return name if vocab_size is None else f"{name}-{vocab_size}"
+
+
+def get_tokenizer(path, vocab_size, args, cache_size=0):
+    return BenchmarkTokenizer(path, args['cache_dir'], cache_size, vocab_size)
+
+
+def get_bootstrap(args):
+    return Bootstrap(args['bootstrap'], args['confidence'], args['seed']) if args['bootstrap'] else None
+
+
+def read_units(args):
     with open(args['tokenizers'], 'r') as vocabs_file:
         paths = [path.strip() for path in vocabs_file.readlines()]
-        tokenizers = [BenchmarkTokenizer(path) for path in paths]
-        for path, tokenizer in tqdm(zip(paths, tokenizers)):
-            file_name = os.path.basename(path)
-            special = "##" if (file_name.startswith("wordpiece") or file_name.startswith("flota_wordpiece") or \
-                               file_name.startswith("suffix_wordpiece")) else "Ġ"
+    # every tokenizer at every size of the sweep, the sizes of a tokenizer one after the other
+    # so they share the parsed config and the pre-tokenized corpus, and every size only runs its model
+    # over the word types of the corpus (the HF model types on several cpus tokenize it in batches instead)
+    units = []
+    for path in paths:
+        if args['vocab_sizes'] is None:
+            units.append((path, None))
+            continue
+        # the sizes at or above the whole vocabulary are all the whole vocabulary, which is evaluated once
+        full_size = config_vocab_size(path)
+        units.extend((path, vocab_size)
+                     for vocab_size in dict.fromkeys(min(vocab_size, full_size) for vocab_size in args['vocab_sizes']))
+    return paths, units
+
+
+def get_shards(args, cache):
+    return ShardedCorpus(args['corpus_manifest'], WorkQueue(args['queue_dir'], args['claim_timeout']), cache)
+
+
+def run_shard_tasks(args, shards, paths, tokenizers):
+    # the map tasks of the sharded corpus which the selected metrics and the compare mode need
+    needed = registry.consumers(registry.schedule(args['metrics']))
+    tasks = shards.tasks(tokenizers, get_special(paths[0]), needed["tokenized_corpus"] > 0, args['compare'])
+    shards.queue.run(tasks)
+
+
+def queue_worker(args):
+    """
+    A worker of the sharded corpus, in a process of the pool or started separately with --queue_worker,
+    which runs its map tasks until all of them are done
+    """
+    cache = TokenizedCorpusCache(args['cache_dir'], args['chunk_size'], args['mmap'])
+    paths, units = read_units(args)
+    tokenizers = [get_tokenizer(path, vocab_size, args, args['tokenization_cache']) for path, vocab_size in units]
+    run_shard_tasks(args, get_shards(args, cache), paths, tokenizers)
+
+
+def eval_path(path, args, tokenizer=None, vocab_size=None):
+    """
+    A unit of work of the process pool, the tokenizer is loaded inside the worker
+    :param vocab_size: the size of the sub-vocabulary of the tokenizer to evaluate, the whole vocabulary if None
+    """
+    profiler = Profiler() if args['profile'] else NullProfiler()
+    if tokenizer is None:
+        with profiler.timer("load"):
+            tokenizer = get_tokenizer(path, vocab_size, args, args['tokenization_cache'])
+    if args['profile']:
+        instrument(tokenizer, profiler)
+    # the segmentations of a sharded corpus are compared shard by shard by its map tasks
+    compare_corpus = args['compare'] and worker_shards is None
+    metrics = eval_tokenizer(tokenizer, get_special(path), compare_corpus, worker_cache, worker_resources,
+                             worker_store, args['metrics'], worker_sampler, profiler, get_bootstrap(args),
+                             worker_shards)
+    if vocab_size is not None:
+        # the actual size of the sub-vocabulary, larger than requested when the unknown and added tokens exceed it
+        metrics = {"vocab_size": tokenizer.vocab_size, **metrics}
+    report = profiler.report()
+    if report is not None:
+        report["tokenization_cache"] = tokenizer.cache_stats()
+    # the tokenizations repeat within the evaluation of a tokenizer, free them once it is done
+    tokenizer.clear_caches()
+    return metrics, report
+
+
+def main():
+    args = load_args()
+    if args['queue_worker']:
+        queue_worker(args)
+        return
+    rows = []
+    df = {"tokenizer": rows}
+    profiles = {}
+    cache = TokenizedCorpusCache(args['cache_dir'], args['chunk_size'], args['mmap'])
+    resources = ResourceLoader(args['cache_dir'])
+    store = ResultsStore(args['results_dir'])
+    sampler = None
+    if args['sample']:
+        sampler = CorpusSampler(args['sample'], args['sample_method'], args['seed'], args['bootstrap'],
+                                args['confidence'], args['target_width'], args['chunk_size'], args['mmap'])
+    paths, units = read_units(args)
+    names = [get_name(path, vocab_size) for path, vocab_size in units]
+
+    # results are stored by the position of the tokenizer in the paths file,
+    # so the rows of the output are in the same order regardless of the number of workers
+    all_results = [None] * len(units)
+    tokenizers = None
+    shards = None
+    if args['corpus_manifest']:
+        shards = get_shards(args, cache)
+        if args['workers'] > 1:
+            with ProcessPoolExecutor(max_workers=args['workers']) as executor:
+                for future in [executor.submit(queue_worker, args) for _ in range(args['workers'])]:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"An error occurred on a worker of the sharded corpus: {e}")
+        tokenizers = [get_tokenizer(path, vocab_size, args, args['tokenization_cache']) for path, vocab_size in units]
+        # the tasks of the crashed workers are taken over once their claims turn stale
+        run_shard_tasks(args, shards, paths, tokenizers)
+    if args['workers'] > 1:
+        # parse the resources before the workers start so they are all handed the same parsed copy
+        needed = registry.consumers(registry.schedule(args['metrics']))
+        try:
+            if needed["gold_segmentations"]:
+                resources.gold_segmentations(COMBINED)
+            if needed["cognitive_data"]:
+                resources.cognitive_data(EN)
+        except Exception:
+            # a broken resource is reported by every tokenizer that uses it, as in the sequential run
+            pass
+        # load every tokenizer once, so the vocabularies and tries they share are built once in this process
+        # and inherited by the workers copy-on-write instead of being built again by every worker
+        for path, vocab_size in units:
+            try:
+                get_tokenizer(path, vocab_size, args).model.prepare()
+            except Exception:
+                pass
+        # keep the garbage collector from touching the inherited objects, which would copy their pages
+        gc.freeze()
+        with ProcessPoolExecutor(max_workers=args['workers'], initializer=init_worker,
+                                 initargs=(cache, resources, store, sampler, shards)) as executor:
+            futures = {executor.submit(eval_path, path, args, None, vocab_size): i
+                       for i, (path, vocab_size) in enumerate(units)}
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                i = futures[future]
+                try:
+                    all_results[i] = future.result()
+                except Exception as e:
+                    print(f"An error occurred on {names[i]}: {e}")
+    else:
+        init_worker(cache, resources, store, sampler, shards)
+        if tokenizers is None:
+            tokenizers = [get_tokenizer(path, vocab_size, args, args['tokenization_cache'])
+                          for path, vocab_size in units]
+        for i, ((path, vocab_size), tokenizer) in tqdm(enumerate(zip(units, tokenizers))):
             try:
-                results = eval_tokenizer(tokenizer, tokenizers, special,args['compare'])
-                if not metrics:
-                    metrics = list(results.keys())
-                    for metric in metrics:
-                        df[metric] = []
-                names.append(os.path.basename(path).rstrip(".json"))
-                for metric in metrics:
-                    df[metric].append(results[metric])
+                all_results[i] = eval_path(path, args, tokenizer, vocab_size)
             except Exception as e:
-                print(f"An error occurred on {path.strip()}: {e}")
+                print(f"An error occurred on {names[i]}: {e}")
+
+    for name, evaluation in zip(names, all_results):
+        if evaluation is None:
+            continue
+        results, profile = evaluation
+        for metric in results:
+            # a column the previous tokenizers have no value for, like the confidence interval of byte_fertility
+            # which is only computed for the byte level tokenizers
+            df.setdefault(metric, [None] * len(rows))
+        rows.append(name)
+        for metric in df:
+            if metric != "tokenizer":
+                df[metric].append(results.get(metric))
+        profiles[name] = profile
+
+    # comparative measures
+    if args['compare']:
+        # The pairwise segmentation difference matrix of all the tokenizers
+        # This counts on the fact that the vocabulary is the same for all tokenizers
+        # And that the special token of the default inference (the first tokenizer) fits all of them
+        try:
+            if tokenizers is None:
+                tokenizers = [get_tokenizer(path, vocab_size, args) for path, vocab_size in units]
+            start = time.perf_counter()
+            if shards:
+                diff = shards.segmentation_diff(names, tokenizers, get_special(paths[0]))
+            else:
+                diff = run_comp(names, tokenizers, get_special(paths[0]), cache, not args['compare_types'])
+            diff.round(4).to_csv(DIFF_OUTPUT)
+            profiles["compare_seconds"] = time.perf_counter() - start
+        except Exception as e:
+            print(f"An error occurred while comparing the tokenizers: {e}")
+    if args['compare_cognitive']:
+        # paired bootstrap tests of the differences between the cognitive correlations of the tokenizers
+        try:
+            if tokenizers is None:
+                tokenizers = [get_tokenizer(path, vocab_size, args) for path, vocab_size in units]
+            cog_diff = human_comp.cog_differences(names, tokenizers, resources.cognitive_data(EN), get_bootstrap(args))
+            cog_diff.round(4).to_csv(COG_DIFF_OUTPUT, index=False)
+        except Exception as e:
+            print(f"An error occurred while comparing the cognitive correlations: {e}")
 
     df = pd.DataFrame(df).round(4)
-    df.to_csv('output.csv', index=False)
+    df.to_csv(OUTPUT, index=False)
+    if args['profile']:
+        with open(PROFILE_OUTPUT, 'w') as profile_file:
+            json.dump(profiles, profile_file, indent=2)
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+The per tokenizer breakdown of the evaluation written to profile.json (--profile): the time of every stage and
+metric, the time, number of calls and calls/sec of the normalizer, pre-tokenizer and model (of encode_batch for the
+HF model types tokenized in batches), the words of the corpus per second of tokenizing it (not reported when the
+tokenized corpus is loaded from the cache), the peak RSS of the evaluation above the RSS before it (linux only) and
+the hits, misses and evictions of the tokenization cache.
+"""
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+# the wrapped components of the tokenizer, the other timers are the stages of the evaluation
+COMPONENTS = ("normalizer", "pre_tokenizer", "model", "encode_batch")
+# the components which run the model, once per pre-token or once per batch of texts
+TOKENIZATION = ("model", "encode_batch")
+
+
+def proc_status(field: str) -> int:
+    # a memory field of /proc/self/status in bytes
+    with open("/proc/self/status") as status_file:
+        for line in status_file:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) * 1024
+
+
+def reset_peak_rss() -> int | None:
+    """
+    Reset the peak resident set size of the process to its current size, so the peak of what runs next
+    is not hidden by an earlier peak
+    :return: the current resident set size in bytes, None if the peak cannot be reset (only linux can)
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return proc_status("VmRSS")
+    except OSError:
+        return None
+
+
+class Profiler:
+    """
+    Timers and call counters of the stages of a tokenizer evaluation and of the components of the tokenizer.
+    """
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        # the stages which ran the model, and the words of the corpus a stage tokenized
+        self.tokenizing = set()
+        self.words = {}
+        self.start = time.perf_counter()
+        self.start_rss = reset_peak_rss()
+
+    def add(self, name: str, seconds: float, calls: int = 1):
+        self.seconds[name] += seconds
+        self.calls[name] += calls
+
+    def tokenization_calls(self) -> int:
+        return sum(self.calls[name] for name in TOKENIZATION)
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        calls = self.tokenization_calls()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+            if self.tokenization_calls() > calls:
+                self.tokenizing.add(name)
+
+    def count_words(self, name: str, num_of_words: int):
+        # the stage tokenized a corpus of num_of_words words, unless it loaded its tokenization from the cache
+        self.words[name] = num_of_words
+
+    def report(self) -> dict:
+        report = {"total_seconds": time.perf_counter() - self.start}
+        # the peak of the evaluation of this tokenizer above the memory the process held before it
+        report["peak_rss_delta_bytes"] = None if self.start_rss is None else proc_status("VmHWM") - self.start_rss
+        for name, seconds in self.seconds.items():
+            report[name] = {"seconds": seconds, "calls": self.calls[name]}
+            if name in COMPONENTS:
+                report[name]["calls_per_sec"] = self.calls[name] / seconds if seconds else None
+        for name, num_of_words in self.words.items():
+            if name in self.tokenizing and self.seconds[name]:
+                # the words of the corpus per second of the whole stage: reading, pre-tokenizing and tokenizing it
+                report["words_per_sec"] = num_of_words / self.seconds[name]
+        return report
+
+
+class NullProfiler:
+    """
+    The profiler used when profiling is off, its timers do nothing.
+    """
+
+    def timer(self, name: str):
+        return nullcontext()
+
+    def count_words(self, name: str, num_of_words: int):
+        pass
+
+    def report(self):
+        return None
+
+
+def wrap(obj, method_name: str, name: str, profiler: Profiler):
+    method = getattr(obj, method_name)
+
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            profiler.add(name, time.perf_counter() - start)
+
+    setattr(obj, method_name, timed)
+
+
+def instrument(tokenizer, profiler: Profiler):
+    """
+    Count and time the calls of the normalizer, the pre-tokenizer and the model of a BenchmarkTokenizer.
+    The methods are only wrapped on the instances of a profiled run, so there is no overhead otherwise.
+    The model calls are per pre-token type of the corpus, the words per second are those of the corpus stage.
+    """
+    wrap(tokenizer.normalizer, "normalize_str", "normalizer", profiler)
+    wrap(tokenizer.pre_tokenizer, "pre_tokenize_str", "pre_tokenizer", profiler)
+    wrap(tokenizer.model, "tokenize", "model", profiler)
+    if tokenizer.backend_tokenizer is not None:
+        # the HF model types are tokenized in batches instead, one call per batch of texts
+        wrap(tokenizer, "encode_batch", "encode_batch", profiler)
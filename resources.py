@@ -0,0 +1,45 @@
+import os, pickle
+import utils
+from Intrinsic_measures import ling, human_comp
+
+# bumped whenever the layout of the parsed resources changes
+SNAPSHOT_VERSION = 1
+
+
+class ResourceLoader:
+    """
+    Reads every linguistic and cognitive resource once per run, or from a pickled snapshot of its parsed form
+    keyed by the hash of the resource file.
+    The parsed resources are shared read-only by all the tokenizers; a loader filled before the process pool
+    starts its workers is shared with them copy-on-write.
+    """
+
+    def __init__(self, snapshot_dir: str | None):
+        self.snapshot_dir = snapshot_dir
+        self.loaded = {}
+        if self.snapshot_dir:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+
+    def load(self, path: str, kind: str, parse):
+        if (path, kind) in self.loaded:
+            return self.loaded[(path, kind)]
+        snapshot_path = None
+        if self.snapshot_dir:
+            file_name = f"{utils.file_hash(path)[:16]}-{kind}-v{SNAPSHOT_VERSION}.pkl"
+            snapshot_path = os.path.join(self.snapshot_dir, file_name)
+        if snapshot_path and os.path.exists(snapshot_path):
+            with open(snapshot_path, 'rb') as snapshot_file:
+                resource = pickle.load(snapshot_file)
+        else:
+            resource = parse(path)
+            if snapshot_path:
+                with utils.atomic_write(snapshot_path) as snapshot_file:
+                    pickle.dump(resource, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.loaded[(path, kind)] = resource
+        return resource
+
+    def gold_segmentations(self, combined_path: str):
+        return self.load(combined_path, "combined", ling.load_combined)
+
+    def cognitive_data(self, cog_path: str):
+        return self.load(cog_path, "cog", human_comp.load_cog)
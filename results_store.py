@@ -0,0 +1,56 @@
+import os, json, hashlib
+import utils
+
+# bumped whenever the computation of the stored metrics changes, so stale results are recomputed
+RESULTS_VERSION = 3
+
+
+class ResultsStore:
+    """
+    The metrics of every tokenizer, keyed by (tokenizer config hash, metric name, resource hash),
+    and by the settings the metric depends on besides the tokenizer and the resource (the special prefix
+    of the word boundaries, the sample of the corpus).
+    Every metric is written as soon as it is computed, so an interrupted run resumes where it stopped,
+    and a rerun with a new tokenizer or a modified resource only computes the missing metrics.
+    Every entry is a small JSON file written atomically, so worker processes never write to the same file.
+    """
+
+    def __init__(self, store_dir: str | None):
+        self.store_dir = store_dir
+        self.resource_hashes = {}
+        if self.store_dir:
+            os.makedirs(self.store_dir, exist_ok=True)
+
+    def resource_hash(self, resource_path: str) -> str:
+        if resource_path not in self.resource_hashes:
+            self.resource_hashes[resource_path] = utils.file_hash(resource_path)
+        return self.resource_hashes[resource_path]
+
+    def entry_path(self, tokenizer, metric: str, resource_path: str, variant: str = "") -> str | None:
+        if not self.store_dir:
+            return None
+        if variant:
+            metric = f"{metric}_{hashlib.blake2b(variant.encode('utf-8'), digest_size=4).hexdigest()}"
+        resource_hash = self.resource_hash(resource_path)[:16] if resource_path else "none"
+        file_name = f"{tokenizer.config_hash[:16]}-{metric}-{resource_hash}-v{RESULTS_VERSION}.json"
+        return os.path.join(self.store_dir, file_name)
+
+    def get(self, tokenizer, metric: str, resource_path: str, compute, variant: str = "") -> dict:
+        """
+        :param resource_path: the resource the metric is computed on, None for the metrics of the tokenizer alone
+        :param compute: computes the values of the metric when they are not stored yet
+        :param variant: the settings the metric depends on, if any
+        :return: the values of the metric by column name
+        """
+        entry_path = self.entry_path(tokenizer, metric, resource_path, variant)
+        if entry_path and os.path.exists(entry_path):
+            with open(entry_path, 'r') as entry_file:
+                return json.load(entry_file)["values"]
+        values = compute()
+        if entry_path:
+            entry = {"config": tokenizer.config_filepath, "metric": metric, "resource": resource_path,
+                     "variant": variant, "values": values}
+            with utils.atomic_write(entry_path, 'w') as entry_file:
+                # numpy scalars are stored as floats
+                json.dump(entry, entry_file, default=float)
+        return values
@@ -0,0 +1,241 @@
+"""
+Estimates of the static metrics (fertility, entropy_score, bytes_per_token, chars_per_token and byte_fertility)
+on a random sample of the corpus lines (--sample). Every estimate gets a basic bootstrap interval, which corrects
+for the bias of the estimate: the Rényi efficiency of a sample is higher than that of the whole corpus, so the
+entropy_score estimate of a small sample may lie above its interval. With --target_width the sample is doubled until
+the intervals are narrow enough, the lines of the smaller samples are part of the larger ones so they are
+tokenized once.
+"""
+from functools import cached_property
+from itertools import chain
+import numpy as np
+from scipy import sparse
+import utils
+from const import CORPUS_CHUNK_SIZE
+from tokenized_corpus import TokenIds, count_chars
+from Intrinsic_measures.static import SAMPLED_STATISTICS, TARGET_STATISTICS, BYTE_ENCODING
+
+SAMPLE_METHODS = ["reservoir", "stratified"]
+
+
+def sample_indices(corpus_path: str, size: int, method: str, seed: int, chunk_size: int = CORPUS_CHUNK_SIZE,
+                   use_mmap: bool = False) -> np.ndarray:
+    """
+    The sorted indices of a random sample of the lines of a corpus, read as a stream.
+    Every line gets a random key: reservoir keeps the size lines with the smallest keys,
+    stratified splits the corpus into size strata of consecutive lines and keeps the smallest key of every stratum.
+    With the same seed a larger sample contains the smaller one, so an adaptive run only tokenizes the new lines.
+    """
+    rng = np.random.default_rng(seed)
+    if method == "reservoir":
+        kept_keys = np.empty(0)
+        kept = np.empty(0, dtype=np.int64)
+        start = 0
+        for chunk in utils.iter_corpus(corpus_path, chunk_size, use_mmap=use_mmap):
+            kept_keys = np.concatenate((kept_keys, rng.random(len(chunk))))
+            kept = np.concatenate((kept, np.arange(start, start + len(chunk))))
+            start += len(chunk)
+            if len(kept) > size:
+                smallest = np.argpartition(kept_keys, size - 1)[:size]
+                kept_keys, kept = kept_keys[smallest], kept[smallest]
+        return np.sort(kept)
+
+    num_of_lines = sum(len(chunk) for chunk in utils.iter_corpus(corpus_path, chunk_size, use_mmap=use_mmap))
+    size = min(size, num_of_lines)
+    best_keys = np.full(size, np.inf)
+    best = np.zeros(size, dtype=np.int64)
+    start = 0
+    for chunk in utils.iter_corpus(corpus_path, chunk_size, use_mmap=use_mmap):
+        keys = rng.random(len(chunk))
+        indices = np.arange(start, start + len(chunk))
+        start += len(chunk)
+        strata = indices * size // num_of_lines
+        # the line with the smallest key of every stratum in the chunk
+        order = np.lexsort((keys, strata))
+        first = order[np.flatnonzero(np.diff(strata[order], prepend=-1))]
+        improved = keys[first] < best_keys[strata[first]]
+        best_keys[strata[first][improved]] = keys[first][improved]
+        best[strata[first][improved]] = indices[first][improved]
+    return best
+
+
+class Resamples:
+    """
+    A batch of bootstrap resamples of the lines of a sample, given by the number of times every line is drawn
+    """
+
+    def __init__(self, sample, weights: np.ndarray):
+        self.sample = sample
+        # shape (number of resamples, number of lines in the sample)
+        self.weights = weights
+
+    @cached_property
+    def num_of_tokens(self) -> np.ndarray:
+        return self.weights @ self.sample.line_num_of_tokens
+
+    @cached_property
+    def num_of_words(self) -> np.ndarray:
+        return self.weights @ self.sample.line_num_of_words
+
+    @cached_property
+    def num_of_chars(self) -> np.ndarray:
+        return self.weights @ self.sample.line_num_of_chars
+
+    @cached_property
+    def num_of_bytes(self) -> np.ndarray:
+        return self.weights @ self.sample.line_num_of_bytes
+
+    @cached_property
+    def num_of_token_bytes(self) -> np.ndarray:
+        return self.weights @ self.sample.line_num_of_token_bytes
+
+    @cached_property
+    def piece_frequencies(self) -> np.ndarray:
+        # the frequencies of the whitespace separated pieces of the tokens, the unit of the Rényi efficiency
+        return np.asarray((self.sample.piece_counts.T @ self.weights.T).T)
+
+
+class SampledCorpus:
+    """
+    The tokenization of a random sample of the lines of a corpus.
+    It stands in for TokenizedCorpus in the static metrics, which estimate their value on the sample
+    and report a bootstrap confidence interval of the estimate.
+    """
+
+    def __init__(self, token_ids: TokenIds, line_num_of_words: np.ndarray, line_num_of_chars: np.ndarray,
+                 line_num_of_bytes: np.ndarray, num_of_resamples: int = 1000, confidence: float = 0.95, seed: int = 0):
+        self.token_ids = token_ids
+        self.token_frequencies = token_ids.token_frequencies()
+        self.num_of_words = int(line_num_of_words.sum())
+        self.num_of_chars = int(line_num_of_chars.sum())
+        self.num_of_bytes = int(line_num_of_bytes.sum())
+        self.num_of_lines = len(token_ids)
+        self.line_num_of_tokens = token_ids.lengths().astype(np.float64)
+        self.line_num_of_words = line_num_of_words.astype(np.float64)
+        self.line_num_of_chars = line_num_of_chars.astype(np.float64)
+        self.line_num_of_bytes = line_num_of_bytes.astype(np.float64)
+        # a sparse lines x pieces count matrix, the product of the lines x tokens and the tokens x pieces counts
+        piece_ids = {}
+        token_pieces, inverse = token_ids.id_table(lambda token: [piece_ids.setdefault(piece, len(piece_ids))
+                                                             for piece in token.split()], object)
+        line_tokens = sparse.csr_matrix((np.ones(len(inverse)), (np.repeat(np.arange(self.num_of_lines),
+                                                                           token_ids.lengths()), inverse)),
+                                        shape=(self.num_of_lines, len(token_pieces)))
+        rows = np.repeat(np.arange(len(token_pieces)), [len(pieces) for pieces in token_pieces])
+        columns = np.fromiter(chain.from_iterable(token_pieces), dtype=np.int64, count=len(rows))
+        tokens_pieces = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)),
+                                          shape=(len(token_pieces), len(piece_ids)))
+        self.piece_counts = (line_tokens @ tokens_pieces).tocsr()
+        self.num_of_resamples = num_of_resamples
+        self.confidence = confidence
+        self.seed = seed
+        self.intervals = {}
+
+    def num_of_tokens(self):
+        return self.token_frequencies.num_of_tokens()
+
+    @cached_property
+    def line_num_of_token_bytes(self) -> np.ndarray:
+        # the number of bytes the tokens of every line stand for, only defined for the byte level tokenizers
+        token_bytes, inverse = self.token_ids.id_table(lambda token: len(BYTE_ENCODING.tobytes(token)), np.float64)
+        lines = np.repeat(np.arange(self.num_of_lines), self.token_ids.lengths())
+        return np.bincount(lines, weights=token_bytes[inverse], minlength=self.num_of_lines)
+
+    def bootstrap(self, statistic) -> np.ndarray:
+        """
+        :param statistic: computes the statistic of every resample of a batch of Resamples
+        :return: the statistic of every bootstrap resample
+        """
+        rng = np.random.default_rng(self.seed)
+        # bound the memory of the weights and of the piece frequencies of a batch
+        batch_size = max(1, min(self.num_of_resamples,
+                                2 ** 22 // max(self.num_of_lines, self.piece_counts.shape[1], 1)))
+        values = []
+        for start in range(0, self.num_of_resamples, batch_size):
+            size = min(batch_size, self.num_of_resamples - start)
+            # the number of times every line is drawn in every resample
+            draws = rng.integers(0, self.num_of_lines, size=(size, self.num_of_lines))
+            draws += np.arange(size)[:, None] * self.num_of_lines
+            weights = np.bincount(draws.ravel(), minlength=size * self.num_of_lines).reshape(size, -1)
+            weights = weights.astype(np.float64)
+            values.append(statistic(Resamples(self, weights)))
+        return np.concatenate(values)
+
+    def confidence_interval(self, name: str) -> dict[str:float]:
+        """
+        The basic bootstrap interval of the statistic, the percentiles of the resamples reflected around the estimate.
+        Unlike the percentile interval it corrects for the bias of the estimate: the Rényi efficiency of fewer lines
+        is higher since their vocabulary is smaller, and resampling the sample shifts it further the same way.
+        """
+        if name not in self.intervals:
+            alpha = (1 - self.confidence) / 2
+            estimate = SAMPLED_STATISTICS[name](Resamples(self, np.ones((1, self.num_of_lines))))[0]
+            low, high = np.quantile(self.bootstrap(SAMPLED_STATISTICS[name]), [alpha, 1 - alpha])
+            self.intervals[name] = {f"{name}_ci_low": float(2 * estimate - high),
+                                    f"{name}_ci_high": float(2 * estimate - low)}
+        return self.intervals[name]
+
+    def widest_interval(self) -> float:
+        widths = []
+        for name in TARGET_STATISTICS:
+            interval = self.confidence_interval(name)
+            widths.append(interval[f"{name}_ci_high"] - interval[f"{name}_ci_low"])
+        return max(widths)
+
+
+class CorpusSampler:
+    """
+    Estimates the static metrics on a sample of the corpus lines instead of the whole corpus.
+    In the adaptive mode the sample size is doubled until the confidence intervals of TARGET_STATISTICS
+    are narrower than the target width, or the whole corpus is sampled.
+    """
+
+    def __init__(self, size: int, method: str = "reservoir", seed: int = 0, num_of_resamples: int = 1000,
+                 confidence: float = 0.95, target_width: float | None = None, chunk_size: int = CORPUS_CHUNK_SIZE,
+                 use_mmap: bool = False):
+        self.size = size
+        self.method = method
+        self.seed = seed
+        self.num_of_resamples = num_of_resamples
+        self.confidence = confidence
+        self.target_width = target_width
+        self.chunk_size = chunk_size
+        self.use_mmap = use_mmap
+
+    def key(self) -> str:
+        # identifies the settings of the sample in the results store
+        return f"sample {self.method} {self.size} {self.seed} {self.num_of_resamples} {self.confidence} " \
+               f"{self.target_width}"
+
+    def sample(self, tokenizer, corpus_path: str) -> SampledCorpus:
+        parts = []
+        # the part and the position in it of the tokenization of every sampled line
+        positions = {}
+        # the number of words, characters and utf-8 bytes of every sampled line
+        line_counts = {}
+        size = self.size
+        while True:
+            indices = sample_indices(corpus_path, size, self.method, self.seed, self.chunk_size, self.use_mmap)
+            new = set(indices.tolist()) - positions.keys()
+            lines = (line for chunk in utils.iter_corpus(corpus_path, self.chunk_size, use_mmap=self.use_mmap)
+                     for line in chunk)
+            new_indices, new_lines = [], []
+            for index, text in enumerate(lines):
+                if len(new_indices) == len(new):
+                    break
+                if index in new:
+                    new_indices.append(index)
+                    new_lines.append(text)
+                    line_counts[index] = (len(text.split(" ")), *count_chars([text]))
+            start = sum(len(part) for part in parts)
+            positions.update((index, start + position) for position, index in enumerate(new_indices))
+            parts.append(TokenIds.build(tokenizer, new_lines))
+            token_ids = TokenIds.concatenate(parts)
+            parts = [token_ids]
+            counts = np.array([line_counts[index] for index in indices], dtype=np.int64).reshape(-1, 3)
+            sample = SampledCorpus(token_ids.select(np.array([positions[index] for index in indices], dtype=np.int64)),
+                                   counts[:, 0], counts[:, 1], counts[:, 2], self.num_of_resamples, self.confidence,
+                                   self.seed)
+            if self.target_width is None or len(indices) < size or sample.widest_interval() <= self.target_width:
+                return sample
+            size *= 2
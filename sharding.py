@@ -0,0 +1,221 @@
+"""
+Evaluation of a corpus split into shards (--corpus_manifest) by the workers of a queue in a shared directory
+(--queue_dir). Every (tokenizer, shard) pair, and in the compare mode every shard, is a task which writes the partial
+counts of its shard; the run which merges them writes output.csv and segmentation_diff.csv, which equal those of the
+concatenated shards. The workers are the processes of --workers, the processes started with --queue_worker and the
+processes of other machines sharing the directory. A rerun only runs the tasks of new or modified tokenizers and
+shards, and a task which fails is retried by the other workers and by the merging run, its tokenizer is reported as
+an error only if it fails on all of them.
+"""
+import os, json, time, pickle, socket, hashlib, threading
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, List
+import pandas as pd
+from const import CLAIM_TIMEOUT
+from utils import atomic_write
+from tokenized_corpus import TokenizedCorpus, TokenizedCorpusCache, CACHE_VERSION
+from Intrinsic_measures import compare
+
+# how often a worker waiting for the tasks held by the other workers looks at the queue again
+POLL_SECONDS = 1.0
+
+
+def read_manifest(manifest_path: str) -> List[str]:
+    # one shard path per line, relative paths are relative to the directory of the manifest
+    with open(manifest_path, 'r') as manifest_file:
+        lines = [line.strip() for line in manifest_file]
+    return [os.path.join(os.path.dirname(manifest_path), line) for line in lines if line]
+
+
+class WorkQueue:
+    """
+    A queue of named tasks shared through a directory by worker processes, on one machine or on several machines
+    with a shared filesystem. A worker claims a task by creating its lock file exclusively, refreshes the lock
+    while it runs the task, and writes the result of the task atomically.
+    A lock which is not refreshed for claim_timeout seconds belongs to a crashed worker: the task is claimed
+    again through the lock file of the next attempt, which again only one worker can create.
+    A worker whose task fails removes its lock, so the task is retried by the other workers and by the next run.
+    """
+
+    def __init__(self, queue_dir: str, claim_timeout: float = CLAIM_TIMEOUT):
+        self.claims_dir = os.path.join(queue_dir, "claims")
+        self.results_dir = os.path.join(queue_dir, "results")
+        self.claim_timeout = claim_timeout
+        self.worker_id = f"{socket.gethostname()}.{os.getpid()}"
+        os.makedirs(self.claims_dir, exist_ok=True)
+        os.makedirs(self.results_dir, exist_ok=True)
+
+    def lock_path(self, task: str, attempt: int) -> str:
+        return os.path.join(self.claims_dir, f"{task}.{attempt}.lock")
+
+    def result_path(self, task: str) -> str:
+        return os.path.join(self.results_dir, f"{task}.pkl")
+
+    def done(self) -> set[str]:
+        return {file_name[:-len(".pkl")] for file_name in os.listdir(self.results_dir) if file_name.endswith(".pkl")}
+
+    def latest_attempts(self) -> dict[str, int]:
+        attempts = {}
+        for file_name in os.listdir(self.claims_dir):
+            if file_name.endswith(".lock"):
+                task, attempt = file_name[:-len(".lock")].rsplit(".", 1)
+                attempts[task] = max(attempts.get(task, 0), int(attempt))
+        return attempts
+
+    def claim(self, task: str, latest_attempt: int | None) -> str | None:
+        """
+        :param latest_attempt: the latest attempt of the task claimed by any worker, None if it was never claimed
+        :return: the lock file of the claim, None if the task is held by another worker
+        """
+        attempt = 0
+        if latest_attempt is not None:
+            try:
+                if time.time() - os.stat(self.lock_path(task, latest_attempt)).st_mtime < self.claim_timeout:
+                    return None
+            except FileNotFoundError:
+                pass
+            attempt = latest_attempt + 1
+        lock_path = self.lock_path(task, attempt)
+        try:
+            lock_file = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # another worker claimed it first
+            return None
+        with os.fdopen(lock_file, 'w') as lock_file:
+            json.dump({"worker": self.worker_id, "time": time.time()}, lock_file)
+        return lock_path
+
+    @contextmanager
+    def hold(self, lock_path: str):
+        # refresh the lock while the task runs, so the other workers do not take it for the lock of a crashed worker
+        stop = threading.Event()
+
+        def refresh():
+            while not stop.wait(self.claim_timeout / 4):
+                os.utime(lock_path)
+
+        thread = threading.Thread(target=refresh, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, task: str, result):
+        with atomic_write(self.result_path(task)) as result_file:
+            pickle.dump(result, result_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def result(self, task: str):
+        try:
+            with open(self.result_path(task), 'rb') as result_file:
+                return pickle.load(result_file)
+        except FileNotFoundError:
+            raise RuntimeError(f"The task {task} is not done, it failed on every worker that ran it")
+
+    def run(self, tasks: dict[str, Callable]):
+        """
+        Run the tasks which no other worker holds until all of them are done, in order,
+        waiting for the tasks held by the other workers to be done or to be re-queued.
+        A task which fails is released for the other workers and not run again by this worker,
+        so its result is missing when every worker failed it.
+        """
+        failed = set()
+        while True:
+            done = self.done()
+            pending = [task for task in tasks if task not in done and task not in failed]
+            if not pending:
+                return
+            latest_attempts = self.latest_attempts()
+            for task in pending:
+                lock_path = self.claim(task, latest_attempts.get(task))
+                if lock_path is not None:
+                    break
+            else:
+                time.sleep(POLL_SECONDS)
+                continue
+            if os.path.exists(self.result_path(task)):
+                # done by a worker that was taken for crashed
+                continue
+            try:
+                with self.hold(lock_path):
+                    result = tasks[task]()
+            except Exception as e:
+                print(f"An error occurred on the task {task}: {e}")
+                failed.add(task)
+                os.remove(lock_path)
+                continue
+            self.complete(task, result)
+
+
+class ShardedCorpus:
+    """
+    A corpus split into the shard files listed by a manifest.
+    The static metrics and the occurrence weighted segmentation difference are sums over the lines of the corpus,
+    so the map tasks tokenize every shard independently into partial aggregates (the token, word, character and
+    byte counts of every tokenizer and the disagreement counts of all the tokenizers), which the reduce merges.
+    The tasks are keyed by the tokenizer config hashes, the shard hashes and the version of the cache,
+    so a worker only has to read the same tokenizers file and manifest to claim tasks from the same queue.
+    The tokenizers with non-deterministic inference (BPE dropout) are never queued, like they are never cached:
+    their shards are tokenized again by the reduce.
+    """
+
+    def __init__(self, manifest_path: str, queue: WorkQueue, cache: TokenizedCorpusCache):
+        self.manifest_path = manifest_path
+        self.shard_paths = read_manifest(manifest_path)
+        self.queue = queue
+        self.cache = cache
+
+    def key(self) -> str:
+        # identifies the content of the shards in the results store
+        shard_hashes = " ".join(self.cache.corpus_hash(shard_path) for shard_path in self.shard_paths)
+        return f"shards {hashlib.blake2b(shard_hashes.encode('utf-8'), digest_size=8).hexdigest()}"
+
+    def corpus_task(self, tokenizer, shard_path: str) -> str:
+        return f"corpus-v{CACHE_VERSION}-{tokenizer.config_hash[:16]}-{self.cache.corpus_hash(shard_path)[:16]}"
+
+    def compare_task(self, tokenizers, special: str, shard_path: str) -> str:
+        key = " ".join([tokenizer.config_hash for tokenizer in tokenizers] + [special])
+        return f"compare-v{CACHE_VERSION}-{hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()}-" \
+               f"{self.cache.corpus_hash(shard_path)[:16]}"
+
+    def tasks(self, tokenizers, special: str, corpus: bool = True, compare_tokenizers: bool = False) \
+            -> dict[str, Callable]:
+        """
+        :param corpus: tokenize every shard with every tokenizer
+        :param compare_tokenizers: count the disagreements between the segmentations of every shard by all the tokenizers
+        :return: the map tasks by name, shard by shard so the tokenizers which pre-tokenize alike share the word types
+        of the shard
+        """
+        tasks = {}
+        for shard_path in self.shard_paths:
+            if corpus:
+                for tokenizer in tokenizers:
+                    if tokenizer.is_deterministic():
+                        tasks[self.corpus_task(tokenizer, shard_path)] = partial(self.cache.tokenized_corpus,
+                                                                                 tokenizer, shard_path)
+            if compare_tokenizers and all(tokenizer.is_deterministic() for tokenizer in tokenizers):
+                tasks[self.compare_task(tokenizers, special, shard_path)] = partial(
+                    self.disagreement_counts, tokenizers, special, shard_path)
+        return tasks
+
+    def disagreement_counts(self, tokenizers, special: str, shard_path: str):
+        return compare.disagreement_counts(tokenizers, special, self.cache, shard_path, True, self.cache.chunk_size)
+
+    def tokenized_corpus(self, tokenizer) -> TokenizedCorpus:
+        if not tokenizer.is_deterministic():
+            return TokenizedCorpus.merge([self.cache.tokenized_corpus(tokenizer, shard_path)
+                                          for shard_path in self.shard_paths])
+        return TokenizedCorpus.merge([self.queue.result(self.corpus_task(tokenizer, shard_path))
+                                      for shard_path in self.shard_paths])
+
+    def segmentation_diff(self, names: List[str], tokenizers, special: str) -> pd.DataFrame:
+        diff, total = 0, 0
+        for shard_path in self.shard_paths:
+            if all(tokenizer.is_deterministic() for tokenizer in tokenizers):
+                shard_diff, shard_total = self.queue.result(self.compare_task(tokenizers, special, shard_path))
+            else:
+                shard_diff, shard_total = self.disagreement_counts(tokenizers, special, shard_path)
+            diff, total = diff + shard_diff, total + shard_total
+        return pd.DataFrame(diff / total, index=names, columns=names)
@@ -0,0 +1,82 @@
+import random
+import pytest
+from benchmark_objects import BenchmarkModel
+
+MASK = "▁"
+ALPHABET = "abcd#" + MASK
+
+
+class ReferenceFlotaTokenizer:
+    """
+    The FLOTA implementation the trie engine replaced, kept as the reference of its segmentations
+    """
+
+    def __init__(self, vocab, special="Ġ"):
+        self.vocab = vocab
+        self.special = special
+
+    def max_subword_split(self, w):
+        for l in range(len(w), 0, -1):
+            for i in range(0, len(w) - l + 1):
+                if w[i] == "▁":
+                    continue
+                subword = w[i:i + l]
+                if self.special == "Ġ":
+                    if subword in self.vocab:
+                        return subword, w[:i] + l * "▁" + w[i + l:], i
+                else:
+                    if i == 0:
+                        if subword in self.vocab:
+                            return subword, w[:i] + l * "▁" + w[i + l:], i
+                    else:
+                        if (self.special + subword) in self.vocab:
+                            return self.special + subword, w[:i] + l * "▁" + w[i + l:], i
+        return None, None, None
+
+    def get_flota_dict(self, w):
+        max_subword, rest, i = self.max_subword_split(w)
+        if max_subword is None:
+            return dict()
+        if rest == len(rest) * "▁":
+            flota_dict = {i: max_subword}
+            return flota_dict
+        flota_dict = self.get_flota_dict(rest)
+        flota_dict[i] = max_subword
+        return flota_dict
+
+    def tokenize(self, w):
+        flota_dict = self.get_flota_dict(w)
+        return [subword for i, subword in sorted(flota_dict.items())]
+
+
+def random_vocab(rng, size, special="##"):
+    # entries and continuation entries over a small alphabet, so the words have many overlapping matches
+    tokens = set()
+    while len(tokens) < size:
+        token = "".join(rng.choices(ALPHABET, k=rng.randint(1, 4)))
+        tokens.add(special + token if rng.random() < 0.4 else token)
+    return {token: i for i, token in enumerate(sorted(tokens))}
+
+
+def random_words(rng, count):
+    return ["".join(rng.choices(ALPHABET, k=rng.randint(1, 16))) for _ in range(count)]
+
+
+@pytest.mark.parametrize("model_type, special", [("flota", "Ġ"), ("WP_flota", "##")])
+@pytest.mark.parametrize("seed", range(5))
+def test_flota_matches_reference(model_type, special, seed):
+    rng = random.Random(seed)
+    vocab = random_vocab(rng, rng.choice([10, 40, 120]))
+    model = BenchmarkModel({"type": model_type, "vocab": vocab})
+    reference = ReferenceFlotaTokenizer(vocab, special)
+    for word in random_words(rng, 600):
+        assert [token.value for token in model.tokenize(word)] == reference.tokenize(word), word
+
+
+def test_flota_unigram_vocab():
+    rng = random.Random(0)
+    vocab = random_vocab(rng, 60, special="Ġ")
+    model = BenchmarkModel({"type": "flota", "vocab": [[token, -1.0] for token in vocab]})
+    reference = ReferenceFlotaTokenizer(vocab)
+    for word in random_words(rng, 300):
+        assert [token.value for token in model.tokenize(word)] == reference.tokenize(word), word
@@ -0,0 +1,79 @@
+import json
+import random
+import pandas as pd
+import pytest
+from benchmark_objects import BenchmarkTokenizer
+from Intrinsic_measures.ling_utils import GoldSegmentations, get_seg_coverage
+
+ALPHABET = "abcd"
+
+
+def reference_boundaries(tokenization):
+    return [len(''.join(tokenization[:i])) for i in range(1, len(tokenization))]
+
+
+def reference_seg_coverage(x, tokenizer, key_in_df, get_gstandard, special):
+    # the iterrows implementation get_seg_coverage was vectorized from
+    tps = fps = fns = 0
+    for _, row in x.iterrows():
+        gstandard = get_gstandard(row)
+        gstandard[0] = "Ġ" + gstandard[0]
+        if "".join(gstandard) not in tokenizer.get_vocab():
+            if special == "##":
+                gstandard = list(map(lambda tok: "##" + tok, gstandard))
+                gstandard[0] = gstandard[0][2:]
+            if all(token in tokenizer.get_vocab() for token in gstandard):
+                y = [x for x in tokenizer.tokenize(row[key_in_df])]
+                gstandard_boundaries = reference_boundaries(gstandard)
+                y_boundaries = reference_boundaries(y)
+                for i in y_boundaries:
+                    if i in gstandard_boundaries:
+                        tps += 1
+                    else:
+                        fps += 1
+                for i in gstandard_boundaries:
+                    if i not in y_boundaries:
+                        fns += 1
+    return {"f1": tps / (tps + 0.5 * (fps + fns))}
+
+
+def random_piece(rng):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 3)))
+
+
+def gold_frame(rng, size):
+    words, segmentations = [], []
+    for _ in range(size):
+        segmentation = [random_piece(rng) for _ in range(rng.randint(1, 3))]
+        words.append("".join(segmentation))
+        segmentations.append(segmentation)
+    # words without a gold segmentation
+    words += ["ab", "cd"]
+    segmentations += [[], []]
+    return pd.DataFrame({"Word": words, "Gold_standard_segmentation": [str(s) for s in segmentations]})
+
+
+def write_tokenizer(tmp_path, model_type, rng):
+    pieces = sorted({random_piece(rng) for _ in range(40)} | set(ALPHABET))
+    vocab = {token: idx for idx, token in enumerate(["Ġ" + piece for piece in pieces] + pieces
+                                                    + ["##" + piece for piece in pieces])}
+    config = {"added_tokens": [], "normalizer": None,
+              "pre_tokenizer": {"type": "ByteLevel", "add_prefix_space": True, "trim_offsets": True,
+                                "use_regex": True},
+              "model": {"type": model_type, "vocab": vocab}}
+    config_path = tmp_path / "tokenizer.json"
+    config_path.write_text(json.dumps(config))
+    return BenchmarkTokenizer(str(config_path))
+
+
+@pytest.mark.parametrize("model_type, special", [("flota", "Ġ"), ("flota", "▁"), ("WP_flota", "##")])
+@pytest.mark.parametrize("seed", range(3))
+def test_seg_coverage_matches_the_reference(tmp_path, model_type, special, seed):
+    rng = random.Random(seed)
+    tokenizer = write_tokenizer(tmp_path, model_type, rng)
+    frame = gold_frame(rng, 300)
+    # the reference fails on the words without a gold segmentation, which are never selected
+    with_gold = frame[frame["Gold_standard_segmentation"] != "[]"]
+    expected = reference_seg_coverage(with_gold, tokenizer, "Word", lambda row: eval(row['Gold_standard_segmentation']),
+                                      special)
+    assert get_seg_coverage(GoldSegmentations.from_frame(frame), tokenizer, special) == expected
@@ -0,0 +1,64 @@
+import random
+import pytest
+from benchmark_objects import BenchmarkModel
+
+ALPHABET = "abcd#"
+
+
+class ReferenceLongestSuffix:
+    """
+    The longest suffix implementation the reversed trie engine replaced, kept as the reference of its segmentations
+    """
+
+    def __init__(self, vocab, special="Ġ"):
+        self.vocab = vocab
+        self.special = special
+
+    def tokenize(self, w):
+        tokens = []
+        i = 0
+        while w and i < len(w):
+            if self.special == "Ġ":
+                if w[i:] in self.vocab:
+                    tokens.insert(0, w[i:])
+                    w = w[:i]
+                    i = 0
+                else:
+                    i += 1
+            else:
+                if i == 0:
+                    if w[i:] in self.vocab:
+                        tokens.insert(0, w[i:])
+                        w = w[:i]
+                        i = 0
+                    else:
+                        i += 1
+                else:
+                    if self.special + w[i:] in self.vocab:
+                        tokens.insert(0, self.special + w[i:])
+                        w = w[:i]
+                        i = 0
+                    else:
+                        i += 1
+        return tokens
+
+
+def random_vocab(rng, size):
+    # entries and ## continuation entries over a small alphabet, so the words have many overlapping suffixes
+    tokens = set()
+    while len(tokens) < size:
+        token = "".join(rng.choices(ALPHABET, k=rng.randint(1, 4)))
+        tokens.add("##" + token if rng.random() < 0.4 else token)
+    return {token: i for i, token in enumerate(sorted(tokens))}
+
+
+@pytest.mark.parametrize("model_type, special", [("longest_suffix", "Ġ"), ("WP_longest_suffix", "##")])
+@pytest.mark.parametrize("seed", range(5))
+def test_longest_suffix_matches_reference(model_type, special, seed):
+    rng = random.Random(seed)
+    vocab = random_vocab(rng, rng.choice([10, 40, 120]))
+    model = BenchmarkModel({"type": model_type, "vocab": vocab})
+    reference = ReferenceLongestSuffix(vocab, special)
+    for _ in range(600):
+        word = "".join(rng.choices(ALPHABET, k=rng.randint(1, 16)))
+        assert [token.value for token in model.tokenize(word)] == reference.tokenize(word), word
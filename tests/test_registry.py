@@ -0,0 +1,62 @@
+from collections import Counter
+import pytest
+import main
+from Intrinsic_measures import registry
+from results_store import ResultsStore
+
+
+class StubTokenizer:
+    def get_type(self):
+        return "stub"
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    # a registry of metrics over two prerequisites, in an order which interleaves them
+    monkeypatch.setattr(registry, "METRICS", {})
+    registry.register("a", requires=["corpus", "tokenizer"])(lambda corpus, tokenizer: {"a": corpus})
+    registry.register("b", requires=["gold"])(lambda gold: {"b": gold})
+    registry.register("c", requires=["corpus"])(lambda corpus: {"c": corpus * 2})
+    registry.register("d", requires=["gold", "special"])(lambda gold, special: {"d": special})
+    registry.register("e", requires=["tokenizer"])(lambda tokenizer: {"e": tokenizer.get_type()})
+    return registry.METRICS
+
+
+def test_schedule_groups_the_consumers_of_a_prerequisite(metrics):
+    assert [metric.name for metric in registry.schedule()] == ["a", "c", "e", "b", "d"]
+    assert [metric.name for metric in registry.schedule(["d", "c"])] == ["c", "d"]
+    assert registry.consumers(registry.schedule()) == Counter({"corpus": 2, "gold": 2})
+
+
+@pytest.mark.parametrize("selected, expected_builds", [
+    (None, {"corpus": 1, "gold": 1}),
+    (["c"], {"corpus": 1}),
+    (["b", "d"], {"gold": 1}),
+    (["e"], {}),
+])
+def test_prerequisites_are_computed_once_and_only_for_the_selected_metrics(metrics, monkeypatch, selected,
+                                                                           expected_builds):
+    builds = Counter()
+
+    def build(name, value):
+        def builder(tokenizer, cache, resources, sampler, shards):
+            builds[name] += 1
+            return value
+        return builder
+
+    monkeypatch.setattr(main, "PREREQUISITES", {"corpus": ("corpus.txt", build("corpus", 3)),
+                                                "gold": ("gold.csv", build("gold", 5))})
+    results = main.eval_tokenizer(StubTokenizer(), "##", False, None, None, ResultsStore(None), selected)
+    expected = {"a": 3, "b": 5, "c": 6, "d": "##", "e": "stub"}
+    assert results == {"type": "stub", **{name: value for name, value in expected.items()
+                                          if selected is None or name in selected}}
+    assert builds == Counter(expected_builds)
+
+
+def test_a_metric_of_the_tokenizer_alone_is_stored(metrics, tmp_path):
+    tokenizer = StubTokenizer()
+    tokenizer.config_hash, tokenizer.config_filepath = "0" * 64, "stub.json"
+    store = ResultsStore(str(tmp_path))
+    assert main.eval_tokenizer(tokenizer, "##", False, None, None, store, ["e"]) == {"type": "stub", "e": "stub"}
+    metrics["e"] = registry.Metric("e", lambda tokenizer: pytest.fail("recomputed a stored metric"), ["tokenizer"])
+    assert main.eval_tokenizer(tokenizer, "##", False, None, None, store, ["e"]) == {"type": "stub", "e": "stub"}
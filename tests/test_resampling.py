@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from scipy.stats import pearsonr, spearmanr
+from Intrinsic_measures.resampling import Bootstrap, weighted_correlations
+
+CORRELATIONS = {"pearson": pearsonr, "spearman": spearmanr}
+NUM_OF_ITEMS = 40
+
+
+def items(seed):
+    # the wordiness takes few distinct values, so its ranks have many ties
+    rng = np.random.default_rng(seed)
+    x = rng.integers(0, 4, size=(3, NUM_OF_ITEMS)) / 4
+    y = x[0] + rng.normal(size=NUM_OF_ITEMS)
+    return x, y
+
+
+@pytest.mark.parametrize("method", ["pearson", "spearman"])
+@pytest.mark.parametrize("seed", range(3))
+def test_weighted_correlations_match_scipy_on_explicit_resamples(method, seed):
+    x, y = items(seed)
+    resamples = np.random.default_rng(seed + 100).integers(0, NUM_OF_ITEMS, size=(20, NUM_OF_ITEMS))
+    weights = np.stack([np.bincount(resample, minlength=NUM_OF_ITEMS) for resample in resamples]).astype(np.float64)
+    expected = [[CORRELATIONS[method](row[resample], y[resample])[0] for resample in resamples] for row in x]
+    np.testing.assert_allclose(weighted_correlations(x, y, weights, method), expected, rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize("method", ["pearson", "spearman"])
+def test_bootstrap_correlations_are_those_of_its_resamples(method):
+    x, y = items(0)
+    bootstrap = Bootstrap(50, seed=7)
+    resamples = bootstrap.rng("words").integers(0, NUM_OF_ITEMS, size=(50, NUM_OF_ITEMS))
+    expected = [[CORRELATIONS[method](row[resample], y[resample])[0] for resample in resamples] for row in x]
+    np.testing.assert_allclose(bootstrap.correlations(x, y, "words", method), expected, rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize("method", ["pearson", "spearman"])
+def test_permutation_pvalues_are_those_of_its_permutations(method):
+    x, y = items(1)
+    bootstrap = Bootstrap(200, seed=3)
+    permutations = bootstrap.rng("words permutations").permuted(np.tile(np.arange(NUM_OF_ITEMS), (200, 1)), axis=1)
+    p_values = bootstrap.permutation_pvalues(x, y, "words", method)
+    for row, p_value in zip(x, p_values):
+        observed = abs(CORRELATIONS[method](row, y)[0])
+        as_strong = sum(abs(CORRELATIONS[method](row, y[permutation])[0]) >= observed * (1 - 1e-12)
+                        for permutation in permutations)
+        assert p_value == pytest.approx((as_strong + 1) / 201)
+        assert 1 / 201 <= p_value <= 1
@@ -0,0 +1,49 @@
+import os
+import pytest
+from sharding import WorkQueue
+
+
+def failing_once(value):
+    calls = []
+
+    def task():
+        calls.append(None)
+        if len(calls) == 1:
+            raise ValueError("transient")
+        return value
+    return task
+
+
+def test_a_failed_task_is_released_and_retried(tmp_path):
+    queue = WorkQueue(str(tmp_path), claim_timeout=60)
+    tasks = {"a": lambda: 1, "b": failing_once(2)}
+    queue.run(tasks)
+    assert queue.done() == {"a"}
+    assert queue.result("a") == 1
+    with pytest.raises(RuntimeError):
+        queue.result("b")
+    # the lock of the failed attempt is removed, so the task is claimed right away instead of after claim_timeout
+    assert "b" not in queue.latest_attempts()
+    queue.run(tasks)
+    assert queue.result("b") == 2
+
+
+def test_a_task_held_by_another_worker_is_not_run(tmp_path):
+    queue = WorkQueue(str(tmp_path), claim_timeout=60)
+    other = WorkQueue(str(tmp_path), claim_timeout=60)
+    lock_path = other.claim("a", None)
+    assert queue.claim("a", queue.latest_attempts().get("a")) is None
+    os.remove(lock_path)
+    other.complete("a", 1)
+    queue.run({"a": lambda: pytest.fail("ran a task which is done")})
+    assert queue.result("a") == 1
+
+
+def test_the_task_of_a_crashed_worker_is_claimed_again(tmp_path):
+    queue = WorkQueue(str(tmp_path), claim_timeout=60)
+    lock_path = WorkQueue(str(tmp_path), claim_timeout=60).claim("a", None)
+    # the lock was last refreshed before the claim timeout
+    os.utime(lock_path, (0, 0))
+    queue.run({"a": lambda: 1})
+    assert queue.result("a") == 1
+    assert queue.latest_attempts() == {"a": 1}
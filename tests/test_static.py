@@ -0,0 +1,30 @@
+import random
+import pytest
+import tokenization_scorer
+from Intrinsic_measures.static import TokenFrequencies, ENTROPY_POWER
+
+
+def random_sentences(rng, count):
+    # tokens with inner, leading and repeated whitespace and empty tokens, which tokenization_scorer splits and drops
+    pieces = ["a", "b", "ab", "Ġc", "##d", "é", "x y", "  z", " a  b ", "", " ", "\t", "a\nb"]
+    return [[rng.choice(pieces) for _ in range(rng.randint(0, 12))] for _ in range(count)]
+
+
+@pytest.mark.parametrize("power", [ENTROPY_POWER, 3.0])
+@pytest.mark.parametrize("seed", range(3))
+def test_renyi_efficiency_matches_tokenization_scorer(power, seed):
+    sentences = random_sentences(random.Random(seed), 400)
+    expected = tokenization_scorer.score(sentences, power=power)
+    assert TokenFrequencies().update(sentences).renyi_efficiency(power) == pytest.approx(expected, rel=1e-12)
+
+
+def test_renyi_efficiency_of_merged_chunks():
+    sentences = random_sentences(random.Random(0), 400)
+    merged = TokenFrequencies()
+    for start in range(0, len(sentences), 70):
+        merged.merge(TokenFrequencies().update(sentences[start:start + 70]))
+    # tokens with no occurrences are left out
+    merged.add("unseen", 0)
+    merged.add("w", 0)
+    expected = tokenization_scorer.score(sentences, power=ENTROPY_POWER)
+    assert merged.renyi_efficiency(ENTROPY_POWER) == pytest.approx(expected, rel=1e-12)
@@ -0,0 +1,59 @@
+import json
+import pytest
+from benchmark_objects import BenchmarkTokenizer, sub_vocabulary_config
+
+ADDED_TOKENS = [{"id": 9, "content": "[UNK]", "special": True}, {"id": 8, "content": "[SEP]", "special": True}]
+WORDS = ["a", "b", "c", "ab", "bc", "abc", "ca", "cab"]
+
+
+def write_config(tmp_path, model_config, added_tokens=(), pre_tokenizer=None):
+    config = {"added_tokens": list(added_tokens), "normalizer": None,
+              "pre_tokenizer": pre_tokenizer or {"type": "Whitespace"}, "model": model_config}
+    config_path = tmp_path / "tokenizer.json"
+    config_path.write_text(json.dumps(config))
+    return str(config_path)
+
+
+def word_level_config():
+    # the special tokens were added last, after every regular entry
+    return {"type": "WordLevel", "vocab": {**{word: idx for idx, word in enumerate(WORDS)}, "[SEP]": 8, "[UNK]": 9},
+            "unk_token": "[UNK]"}
+
+
+def unigram_config():
+    return {"type": "Unigram", "vocab": [[word, -1.0 - idx] for idx, word in enumerate(WORDS)] + [["<unk>", 0.0]],
+            "unk_id": len(WORDS), "byte_fallback": False}
+
+
+def test_word_level_keeps_the_unknown_and_added_tokens():
+    model_config = sub_vocabulary_config(word_level_config(), 5, ADDED_TOKENS)
+    assert model_config["vocab"] == {"a": 0, "b": 1, "c": 2, "[SEP]": 3, "[UNK]": 4}
+
+
+def test_unigram_remaps_the_unk_id():
+    model_config = sub_vocabulary_config(unigram_config(), 4)
+    assert [entry[0] for entry in model_config["vocab"]] == ["a", "b", "c", "<unk>"]
+    assert model_config["unk_id"] == 3
+
+
+@pytest.mark.parametrize("model_config, added_tokens, tokens", [
+    (word_level_config(), ADDED_TOKENS, ["a", "[UNK]", "[UNK]"]),
+    # the unknown pieces of Unigram are tokenized as themselves
+    (unigram_config(), (), ["a", "c", "a", "b", "dd"]),
+])
+def test_sub_vocabulary_tokenizes_unknown_words(tmp_path, model_config, added_tokens, tokens):
+    tokenizer = BenchmarkTokenizer(write_config(tmp_path, model_config, added_tokens), max_vocab_size=4)
+    assert tokenizer.vocab_size == 4
+    assert tokenizer.tokenize("a cab dd") == tokens
+    vocab = tokenizer.get_vocab()
+    assert [token["id"] for token in tokenizer.load_config()["added_tokens"]] == \
+           [vocab[token["content"]] for token in added_tokens]
+
+
+def test_a_sweep_loads_a_split_pre_tokenizer_config_at_every_size(tmp_path):
+    # the sizes of a sweep share the parsed config
+    pre_tokenizer = {"type": "Split", "pattern": {"Regex": " "}, "behavior": "Removed", "invert": False}
+    config_path = write_config(tmp_path, word_level_config(), ADDED_TOKENS, pre_tokenizer)
+    for vocab_size in [4, 6, None]:
+        tokenizer = BenchmarkTokenizer(config_path, max_vocab_size=vocab_size)
+        assert tokenizer.pre_tokenize("a cab") == ["a", "cab"]
@@ -0,0 +1,74 @@
+import json
+import pytest
+from benchmark_objects import BenchmarkTokenizer
+from tokenized_corpus import TokenizedCorpus, TokenIds, WordTypeTable
+
+# the unknown characters are tokenized as themselves by Unigram and as the unknown token by WordPiece
+CORPUS = [["a cab 東京 dd", "ba  abc"], ["c 東京ab", ""]]
+WORDS = ["a", "b", "c", "ab", "bc", "abc", "ca", "cab"]
+
+
+def write_config(tmp_path, model_config):
+    config = {"added_tokens": [], "normalizer": None, "pre_tokenizer": {"type": "Whitespace"}, "model": model_config}
+    config_path = tmp_path / "tokenizer.json"
+    config_path.write_text(json.dumps(config))
+    return str(config_path)
+
+
+def unigram_config(model_type):
+    return {"type": model_type, "vocab": [[word, -1.0 - idx] for idx, word in enumerate(WORDS)] + [["<unk>", 0.0]],
+            "unk_id": len(WORDS), "byte_fallback": False}
+
+
+def word_piece_config():
+    vocab = {token: idx for idx, token in enumerate(WORDS + ["##" + word for word in WORDS] + ["[UNK]"])}
+    return {"type": "WordPiece", "vocab": vocab, "unk_token": "[UNK]", "continuing_subword_prefix": "##",
+            "max_input_chars_per_word": 100}
+
+
+MODEL_CONFIGS = [unigram_config("Unigram"), unigram_config("SaGe_as_Unigram"), unigram_config("WP_equal_like"),
+                 word_piece_config()]
+
+
+@pytest.mark.parametrize("model_config", MODEL_CONFIGS, ids=lambda config: config["type"])
+def test_batched_corpus_matches_the_word_types(tmp_path, model_config):
+    tokenizer = BenchmarkTokenizer(write_config(tmp_path, model_config))
+    batched = TokenizedCorpus.build_batched(tokenizer, CORPUS)
+    word_types = TokenizedCorpus.from_word_types(tokenizer, WordTypeTable.build(tokenizer, CORPUS))
+    assert batched.token_frequencies.counts == word_types.token_frequencies.counts
+    assert (batched.num_of_words, batched.num_of_chars, batched.num_of_bytes) == \
+           (word_types.num_of_words, word_types.num_of_chars, word_types.num_of_bytes)
+
+
+@pytest.mark.parametrize("model_config", MODEL_CONFIGS, ids=lambda config: config["type"])
+@pytest.mark.parametrize("cache_size", [0, 16])
+def test_token_ids_keep_the_unknown_pieces(tmp_path, model_config, cache_size):
+    tokenizer = BenchmarkTokenizer(write_config(tmp_path, model_config), cache_size=cache_size)
+    texts = [text for chunk in CORPUS for text in chunk]
+    token_ids = TokenIds.build(tokenizer, texts)
+    expected = [tokenizer.tokenize(text) for text in texts]
+    assert [token_ids.tokens(text_index) for text_index in range(len(texts))] == expected
+    assert token_ids.token_lengths().tolist() == [len(token) for tokens in expected for token in tokens]
+
+
+def bpe_config(model_type, dropout=None):
+    return {"type": model_type, "vocab": {"a": 0, "b": 1, "c": 2, "ab": 3, "abc": 4}, "merges": ["a b", "ab c"],
+            "dropout": dropout, "unk_token": None, "continuing_subword_prefix": None, "end_of_word_suffix": None,
+            "fuse_unk": False, "byte_fallback": False}
+
+
+def test_the_word_type_pass_bypasses_the_word_cache(tmp_path):
+    tokenizer = BenchmarkTokenizer(write_config(tmp_path, bpe_config("BPE")), cache_size=16)
+    TokenizedCorpus.from_word_types(tokenizer, WordTypeTable.build(tokenizer, [["abc ab abc c"]]))
+    assert tokenizer.cache_stats()["words"]["misses"] == 0
+    # the other callers still go through it
+    assert tokenizer.tokenize("abc abc") == ["abc", "abc"]
+    assert (tokenizer.cache_stats()["words"]["misses"], tokenizer.cache_stats()["words"]["hits"]) == (1, 1)
+
+
+def test_bpe_dropout_never_uses_the_caches(tmp_path):
+    tokenizer = BenchmarkTokenizer(write_config(tmp_path, bpe_config("BPE_dropout", dropout=0.5)), cache_size=16)
+    assert tokenizer.cache_stats() is None
+    # every call samples a new segmentation
+    assert len({tuple(tokenizer.tokenize("abc")) for _ in range(200)}) > 1
+    assert len({tuple(tokenizer.tokenize_batch(["abc"])[0]) for _ in range(200)}) > 1
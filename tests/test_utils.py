@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from utils import LRUCache, atomic_write
+
+
+def test_lru_cache_evicts_the_least_recently_used_entry():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.lookup("a") == 1
+    cache.put("c", 3)
+    assert set(cache.entries) == {"a", "c"}
+    assert cache.lookup("b") is None
+    assert cache.stats() == {"size": 2, "max_size": 2, "hits": 1, "misses": 1, "evictions": 1, "hit_rate": 0.5}
+
+
+def test_lru_cache_computes_only_the_misses():
+    cache = LRUCache(4)
+    computed = []
+    compute = lambda key: computed.append(key) or key.upper()
+    assert [cache.get(key, compute) for key in ["a", "b", "a", "a", "c"]] == ["A", "B", "A", "A", "C"]
+    assert computed == ["a", "b", "c"]
+    assert (cache.hits, cache.misses, cache.evictions) == (2, 3, 0)
+    cache.clear()
+    assert cache.stats()["size"] == 0 and cache.hits == 2
+    assert LRUCache(1).stats()["hit_rate"] is None
+
+
+def test_atomic_write_replaces_the_file_only_once_complete(tmp_path):
+    path = tmp_path / "entry.json"
+    path.write_text("old")
+    with atomic_write(str(path), 'w') as file:
+        file.write("new")
+        assert path.read_text() == "old"
+    assert path.read_text() == "new"
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(path), 'w') as file:
+            file.write("truncated")
+            raise RuntimeError
+    assert path.read_text() == "new"
+    assert os.listdir(tmp_path) == ["entry.json"]
@@ -0,0 +1,399 @@
+import os, pickle, hashlib
+from collections import Counter
+from itertools import chain
+from typing import Iterable, List
+import numpy as np
+import utils
+from const import CORPUS_CHUNK_SIZE
+from Intrinsic_measures.static import TokenFrequencies
+
+# bumped whenever the layout or the content of the cached artifacts changes
+CACHE_VERSION = 5
+
+
+class WordTypeTable:
+    """
+    The pre-token types of a corpus and their number of occurrences.
+    Most of a corpus consists of repeated pre-tokens, so the model only has to run once per type.
+    """
+
+    def __init__(self, word_counts: Counter, first_word_counts: Counter, num_of_words: int, num_of_chars: int,
+                 num_of_bytes: int):
+        self.word_counts = word_counts
+        # the first pre-token of every line, needed for the WP_equal_like post-processing
+        self.first_word_counts = first_word_counts
+        # whitespace separated words, the denominator of the fertility
+        self.num_of_words = num_of_words
+        # the characters and utf-8 bytes of the corpus, the numerators of the compression metrics
+        self.num_of_chars = num_of_chars
+        self.num_of_bytes = num_of_bytes
+
+    @staticmethod
+    def build(tokenizer, corpus: Iterable[List[str]]):
+        """
+        :param corpus: the corpus as chunks of lines, consumed incrementally
+        """
+        word_counts = Counter()
+        first_word_counts = Counter()
+        num_of_words = num_of_chars = num_of_bytes = 0
+        for chunk in corpus:
+            for text in chunk:
+                words = tokenizer.pre_tokenize(text)
+                word_counts.update(words)
+                if words:
+                    first_word_counts[words[0]] += 1
+                num_of_words += len(text.split(" "))
+            chunk_chars, chunk_bytes = count_chars(chunk)
+            num_of_chars += chunk_chars
+            num_of_bytes += chunk_bytes
+        return WordTypeTable(word_counts, first_word_counts, num_of_words, num_of_chars, num_of_bytes)
+
+
+class TokenizedCorpus:
+    """
+    The tokenization of a corpus by a single tokenizer, reduced to token frequencies.
+    It is computed once per tokenizer and handed to every metric that consumes it.
+    """
+
+    def __init__(self, token_frequencies: TokenFrequencies, num_of_words: int, num_of_chars: int, num_of_bytes: int):
+        self.token_frequencies = token_frequencies
+        self.num_of_words = num_of_words
+        self.num_of_chars = num_of_chars
+        self.num_of_bytes = num_of_bytes
+
+    @staticmethod
+    def build(tokenizer, corpus: Iterable[List[str]]):
+        if is_batched(tokenizer):
+            return TokenizedCorpus.build_batched(tokenizer, corpus)
+        return TokenizedCorpus.from_word_types(tokenizer, WordTypeTable.build(tokenizer, corpus))
+
+    @staticmethod
+    def from_word_types(tokenizer, table: WordTypeTable):
+        token_frequencies = TokenFrequencies()
+        # every word type is tokenized once, so the word cache would only record misses
+        if tokenizer.is_deterministic():
+            for word, count in table.word_counts.items():
+                for token in tokenizer.tokenize_word_uncached(word):
+                    token_frequencies.add(token, count)
+        else:
+            # every occurrence gets its own sample of the segmentation
+            for word, count in table.word_counts.items():
+                token_frequencies.update(tokenizer.tokenize_word_uncached(word) for _ in range(count))
+        if tokenizer.get_type() == "WP_equal_like":
+            first_token_counts = Counter()
+            for word, count in table.first_word_counts.items():
+                first_token_counts[tokenizer.tokenize_word_uncached(word)[0]] += count
+            token_frequencies = equal_like_token_frequencies(token_frequencies, first_token_counts)
+        return TokenizedCorpus(token_frequencies, table.num_of_words, table.num_of_chars, table.num_of_bytes)
+
+    @staticmethod
+    def build_batched(tokenizer, corpus: Iterable[List[str]]):
+        """
+        Tokenize every chunk of the corpus in a single call to the HF Tokenizer of the tokenizer,
+        and count the token ids of the chunk at once. The unknown pieces of the Unigram models share a single id,
+        so their tokens are counted instead.
+        """
+        vocab_size = tokenizer.backend_tokenizer.get_vocab_size()
+        id_counts = np.zeros(vocab_size, dtype=np.int64)
+        first_id_counts = np.zeros(vocab_size, dtype=np.int64)
+        token_counts = Counter()
+        first_token_counts = Counter()
+        count_tokens = tokenizer.keeps_unknown_pieces()
+        num_of_words = num_of_chars = num_of_bytes = 0
+        for chunk in corpus:
+            encodings = tokenizer.encode_batch(chunk)
+            if count_tokens:
+                tokenized = [encoding.tokens for encoding in encodings]
+                token_counts.update(chain.from_iterable(tokenized))
+                first_token_counts.update(tokens[0] for tokens in tokenized if tokens)
+            else:
+                ids = np.fromiter(chain.from_iterable(encoding.ids for encoding in encodings), dtype=np.int64)
+                id_counts += np.bincount(ids, minlength=vocab_size)
+                first_ids = [encoding.ids[0] for encoding in encodings if encoding.ids]
+                first_id_counts += np.bincount(first_ids, minlength=vocab_size)
+            num_of_words += sum(len(text.split(" ")) for text in chunk)
+            chunk_chars, chunk_bytes = count_chars(chunk)
+            num_of_chars += chunk_chars
+            num_of_bytes += chunk_bytes
+        id_to_token = tokenizer.backend_tokenizer.id_to_token
+        token_frequencies = TokenFrequencies()
+        for token_id in np.flatnonzero(id_counts):
+            token_frequencies.add(id_to_token(int(token_id)), int(id_counts[token_id]))
+        for token, count in token_counts.items():
+            token_frequencies.add(token, count)
+        if tokenizer.get_type() == "WP_equal_like":
+            for token_id in np.flatnonzero(first_id_counts):
+                first_token_counts[id_to_token(int(token_id))] += int(first_id_counts[token_id])
+            token_frequencies = equal_like_token_frequencies(token_frequencies, first_token_counts)
+        return TokenizedCorpus(token_frequencies, num_of_words, num_of_chars, num_of_bytes)
+
+    @staticmethod
+    def merge(parts: List["TokenizedCorpus"]):
+        # the tokenized corpus of the concatenation of the corpora of the parts, like the shards of a corpus
+        token_frequencies = TokenFrequencies()
+        for part in parts:
+            token_frequencies.merge(part.token_frequencies)
+        return TokenizedCorpus(token_frequencies, sum(part.num_of_words for part in parts),
+                               sum(part.num_of_chars for part in parts), sum(part.num_of_bytes for part in parts))
+
+    def num_of_tokens(self):
+        return self.token_frequencies.num_of_tokens()
+
+    def confidence_interval(self, name: str) -> dict[str:float]:
+        # the metrics of the whole corpus are exact
+        return {}
+
+
+def is_batched(tokenizer) -> bool:
+    # the batches are tokenized in parallel, on a single cpu running the model once per word type does less work
+    return tokenizer.backend_tokenizer is not None and utils.available_cpus() > 1
+
+
+def count_chars(texts: List[str]) -> tuple[int, int]:
+    # the number of characters and of utf-8 bytes of the texts, counted on their concatenation
+    joined = "".join(texts)
+    return len(joined), len(joined.encode("utf-8"))
+
+
+def equal_like_token_frequencies(token_frequencies: TokenFrequencies, first_token_counts: Counter) -> TokenFrequencies:
+    """
+    BenchmarkTokenizer.tokenize prefixes every token with ## except the first token of the text
+    :param first_token_counts: the number of lines every token is the first token of
+    """
+    prefixed_counts = Counter()
+    for token, count in token_frequencies.counts.items():
+        prefixed_counts["##" + token] += count
+    for first_token, count in first_token_counts.items():
+        prefixed_counts["##" + first_token] -= count
+        prefixed_counts[first_token] += count
+    return TokenFrequencies(+prefixed_counts)
+
+
+class TokenIds:
+    """
+    The tokenizations of a list of texts as a flat int32 array of token ids and the offsets of every text in it,
+    instead of a list of token lists.
+    The ids are those of the vocabulary of the tokenizer, tokens outside of it (the ## forms of WP_equal_like)
+    get ids after the vocabulary.
+    """
+
+    def __init__(self, ids: np.ndarray, offsets: np.ndarray, inv_vocab: dict[int:str], extra_tokens: List[str],
+                 first_extra_id: int):
+        self.ids = ids
+        self.offsets = offsets
+        self.inv_vocab = inv_vocab
+        self.extra_tokens = extra_tokens
+        self.first_extra_id = first_extra_id
+
+    @staticmethod
+    def build(tokenizer, texts: List[str]):
+        vocab = tokenizer.get_vocab()
+        first_extra_id = max(vocab.values(), default=-1) + 1
+        if tokenizer.backend_tokenizer is not None and tokenizer.text_cache is None \
+                and not tokenizer.keeps_unknown_pieces():
+            # the ids of the HF model are the ids of the vocabulary,
+            # with the cache on the texts go through tokenize_batch which only encodes the texts missing from it,
+            # and the unknown pieces of the Unigram models get the ids of the tokens outside the vocabulary
+            encodings = tokenizer.encode_batch(texts)
+            lengths = np.fromiter((len(encoding.ids) for encoding in encodings), dtype=np.int64, count=len(texts))
+            ids = np.fromiter(chain.from_iterable(encoding.ids for encoding in encodings), dtype=np.int32,
+                              count=int(lengths.sum()))
+            return TokenIds(ids, np.concatenate(([0], np.cumsum(lengths))), tokenizer.inv_vocab, [], first_extra_id)
+        tokenized = tokenizer.tokenize_batch(texts)
+        extra_ids = {}
+
+        def token_id(token):
+            if token in vocab:
+                return vocab[token]
+            return extra_ids.setdefault(token, first_extra_id + len(extra_ids))
+
+        lengths = np.fromiter((len(tokens) for tokens in tokenized), dtype=np.int64, count=len(texts))
+        ids = np.fromiter(map(token_id, chain.from_iterable(tokenized)), dtype=np.int32, count=int(lengths.sum()))
+        return TokenIds(ids, np.concatenate(([0], np.cumsum(lengths))), tokenizer.inv_vocab, list(extra_ids),
+                        first_extra_id)
+
+    @staticmethod
+    def concatenate(parts: List["TokenIds"]):
+        # the texts of all the parts in order, the ids of the tokens outside the vocabulary are merged
+        extra_ids = {}
+        ids, lengths = [], []
+        for part in parts:
+            part_ids = part.ids
+            if part.extra_tokens:
+                mapping = np.array([extra_ids.setdefault(token, part.first_extra_id + len(extra_ids))
+                                    for token in part.extra_tokens], dtype=np.int32)
+                extra = part_ids >= part.first_extra_id
+                part_ids = part_ids.copy()
+                part_ids[extra] = mapping[part_ids[extra] - part.first_extra_id]
+            ids.append(part_ids)
+            lengths.append(part.lengths())
+        lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+        return TokenIds(np.concatenate(ids) if ids else np.zeros(0, dtype=np.int32),
+                        np.concatenate(([0], np.cumsum(lengths))), parts[0].inv_vocab if parts else {},
+                        list(extra_ids), parts[0].first_extra_id if parts else 0)
+
+    def select(self, text_indices: np.ndarray):
+        # the tokenizations of the given texts, in the given order
+        lengths = self.lengths()[text_indices]
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        positions = np.repeat(self.offsets[:-1][text_indices] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return TokenIds(self.ids[positions], offsets, self.inv_vocab, self.extra_tokens, self.first_extra_id)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def lengths(self) -> np.ndarray:
+        # the number of tokens of every text
+        return np.diff(self.offsets)
+
+    def num_of_tokens(self) -> int:
+        return len(self.ids)
+
+    def token(self, token_id: int) -> str:
+        if token_id >= self.first_extra_id:
+            return self.extra_tokens[token_id - self.first_extra_id]
+        return self.inv_vocab[token_id]
+
+    def tokens(self, text_index: int) -> List[str]:
+        return [self.token(token_id) for token_id in self.ids[self.offsets[text_index]:self.offsets[text_index + 1]]]
+
+    def id_table(self, function, dtype) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: the value of the function on every distinct token, and the index of the token of every id in it
+        """
+        unique_ids, inverse = np.unique(self.ids, return_inverse=True)
+        table = np.fromiter((function(self.token(int(token_id))) for token_id in unique_ids), dtype=dtype,
+                            count=len(unique_ids))
+        return table, inverse
+
+    def token_lengths(self) -> np.ndarray:
+        # the number of characters of every token
+        table, inverse = self.id_table(len, np.int64)
+        return table[inverse]
+
+    def token_frequencies(self) -> TokenFrequencies:
+        counts = np.bincount(self.ids)
+        token_frequencies = TokenFrequencies()
+        for token_id in np.flatnonzero(counts):
+            token_frequencies.add(self.token(int(token_id)), int(counts[token_id]))
+        return token_frequencies
+
+
+def count_words(corpus: Iterable[List[str]]) -> Counter:
+    # occurrences of every whitespace separated word type in the corpus
+    word_counts = Counter()
+    for chunk in corpus:
+        for text in chunk:
+            word_counts.update(text.split())
+    return word_counts
+
+
+def fingerprint(tokens: List[str]) -> int:
+    # a hash of a segmentation that is stable across processes and runs, unlike the built-in hash
+    digest = hashlib.blake2b("\x00".join(tokens).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def equal_like_form(tokens: List[str]) -> List[str]:
+    # the segmentation as WP_equal_like prints it: every token but the first one with the ## prefix
+    if not tokens:
+        return tokens
+    tokens = list(map(lambda tok: "##" + tok if not tok.startswith("##") else tok, tokens))
+    tokens[0] = tokens[0][2:]
+    return tokens
+
+
+def word_fingerprints(tokenizer, corpus: Iterable[List[str]]) -> np.ndarray:
+    """
+    Fingerprints of the tokenization of every whitespace separated word type, in the order of count_words
+    :return: an array of shape (2, number of word types), the fingerprints of the tokenizations
+    and of their WP_equal_like form
+    """
+    words = list(count_words(corpus))
+    fingerprints = np.empty((2, len(words)), dtype=np.int64)
+    for start in range(0, len(words), CORPUS_CHUNK_SIZE):
+        for k, tokens in enumerate(tokenizer.tokenize_batch(words[start:start + CORPUS_CHUNK_SIZE]), start):
+            fingerprints[0, k] = fingerprint(tokens)
+            fingerprints[1, k] = fingerprint(equal_like_form(tokens))
+    return fingerprints
+
+
+class TokenizedCorpusCache:
+    """
+    On-disk cache of tokenized corpora keyed by (tokenizer config hash, corpus hash).
+    Re-running the benchmark only tokenizes the corpus with tokenizers it has not seen yet.
+    Non-deterministic tokenizers (BPE dropout) are never persisted.
+    """
+
+    def __init__(self, cache_dir: str | None, chunk_size: int = CORPUS_CHUNK_SIZE, use_mmap: bool = False):
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        self.use_mmap = use_mmap
+        self.corpus_hashes = {}
+        # the last pre-tokenized corpus, shared by the tokenizers which pre-tokenize alike
+        self.word_types = (None, None)
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def corpus_hash(self, corpus_path: str) -> str:
+        if corpus_path not in self.corpus_hashes:
+            self.corpus_hashes[corpus_path] = utils.file_hash(corpus_path)
+        return self.corpus_hashes[corpus_path]
+
+    def read_corpus(self, corpus_path: str):
+        return utils.iter_corpus(corpus_path, chunk_size=self.chunk_size, use_mmap=self.use_mmap)
+
+    def cache_path(self, tokenizer, corpus_path: str, kind: str, extension: str = "pkl") -> str | None:
+        if not self.cache_dir or not tokenizer.is_deterministic():
+            return None
+        return self.key_path(tokenizer.config_hash, corpus_path, kind, extension)
+
+    def key_path(self, key: str, corpus_path: str, kind: str, extension: str = "pkl") -> str:
+        file_name = f"{key[:16]}-{self.corpus_hash(corpus_path)[:16]}-{kind}-v{CACHE_VERSION}.{extension}"
+        return os.path.join(self.cache_dir, file_name)
+
+    def get(self, tokenizer, corpus_path: str, kind: str, build, extension: str = "pkl", cache_path: str | None = None):
+        """
+        :param extension: pkl for pickled artifacts, npy for arrays which are loaded memory mapped
+        :param cache_path: the path of an artifact which is not keyed by the tokenizer config
+        """
+        cache_path = cache_path or self.cache_path(tokenizer, corpus_path, kind, extension)
+        if cache_path and os.path.exists(cache_path):
+            if extension == "npy":
+                return np.load(cache_path, mmap_mode='r')
+            with open(cache_path, 'rb') as cache_file:
+                return pickle.load(cache_file)
+        artifact = build(self.read_corpus(corpus_path))
+        if cache_path:
+            with utils.atomic_write(cache_path) as cache_file:
+                if extension == "npy":
+                    np.save(cache_file, artifact)
+                else:
+                    pickle.dump(artifact, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        return artifact
+
+    def tokenized_corpus(self, tokenizer, corpus_path: str) -> TokenizedCorpus:
+        if is_batched(tokenizer):
+            return self.get(tokenizer, corpus_path, "corpus",
+                            lambda corpus: TokenizedCorpus.build_batched(tokenizer, corpus))
+        return self.get(tokenizer, corpus_path, "corpus", lambda corpus: TokenizedCorpus.from_word_types(
+            tokenizer, self.word_type_table(tokenizer, corpus_path)))
+
+    def word_type_table(self, tokenizer, corpus_path: str) -> WordTypeTable:
+        """
+        The corpus is pre-tokenized once for all the tokenizers with the same normalizer and pre-tokenizer,
+        like the inference methods and the sub-vocabularies of a tokenizer, which only run their model on its word types
+        """
+        key = (tokenizer.pre_tokenization_hash, self.corpus_hash(corpus_path))
+        if self.word_types[0] != key:
+            cache_path = None
+            if self.cache_dir:
+                cache_path = self.key_path(tokenizer.pre_tokenization_hash, corpus_path, "words")
+            table = self.get(tokenizer, corpus_path, "words", lambda corpus: WordTypeTable.build(tokenizer, corpus),
+                             cache_path=cache_path)
+            self.word_types = (key, table)
+        return self.word_types[1]
+
+    def word_fingerprints(self, tokenizer, corpus_path: str) -> np.ndarray:
+        return self.get(tokenizer, corpus_path, "fingerprints", lambda corpus: word_fingerprints(tokenizer, corpus),
+                        extension="npy")
@@ -1,5 +1,8 @@
-import json, os
-from typing import List
+import json, os, hashlib, mmap, socket
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List
+from const import CORPUS_CHUNK_SIZE
 from tokenizers import normalizers, pre_tokenizers
 
 
@@ -32,14 +35,20 @@ class HFEncoding:
         self.byte_map = HFEncoding.bytes_char()
         # the inverse character to byte mapping
         self.inv_byte_map = {v: k for k, v in self.byte_map.items()}
+        # translation tables between the bytes, read as latin-1 characters, and the mapped characters,
+        # so a whole string is translated at once instead of byte by byte
+        self.encode_table = str.maketrans({chr(b[0]): c for b, c in self.byte_map.items()})
+        self.decode_table = str.maketrans({c: chr(b[0]) for c, b in self.inv_byte_map.items()})
+        # the latin-1 characters which are not mapped characters fail the latin-1 encoding like the others
+        self.decode_table.update({c: "\ufffd" for c in range(256) if chr(c) not in self.inv_byte_map})
 
     # convert an encoded string of our mapped characters back to the original bytes
     def tobytes(self, s: str) -> bytes:
-        return b"".join([self.inv_byte_map[c] for c in s])
+        return s.translate(self.decode_table).encode("latin-1")
 
     # convert a byte string into an encoded string of valid characters
     def toencoded(self, byte_str: bytes) -> str:
-        return "".join([self.byte_map[bytes([c])] for c in byte_str])
+        return byte_str.decode("latin-1").translate(self.encode_table)
 
 
 # read our hex formatted vocab file
@@ -54,19 +63,125 @@ def load_tokenizer(config_filepath):
     return tokenizer_config
 
 
-def corpus_to_list(file_path: str, encoding: str = "utf-8") -> List[str]:
-    corpus = []
+def iter_lines(file_path: str, encoding: str = "utf-8") -> Iterator[str]:
+    with open(file_path, 'r', encoding=encoding) as file:
+        yield from file
+
+
+def iter_lines_mmap(file_path: str, encoding: str = "utf-8") -> Iterator[str]:
+    # only valid for encodings in which b"\n" never appears inside a multi-byte character (e.g. utf-8)
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            for raw_line in iter(mapped_file.readline, b""):
+                line = raw_line.decode(encoding)
+                if "\r" not in line:
+                    yield line
+                    continue
+                # translate line endings the same way as the universal newlines mode of open()
+                parts = line.replace("\r\n", "\n").split("\r")
+                for part in parts[:-1]:
+                    yield part + "\n"
+                if parts[-1]:
+                    yield parts[-1]
+
+
+def iter_corpus(file_path: str, chunk_size: int = CORPUS_CHUNK_SIZE, encoding: str = "utf-8",
+                use_mmap: bool = False) -> Iterator[List[str]]:
+    """
+    Read the corpus lazily as chunks of at most chunk_size lines,
+    so the memory used is bounded by the chunk size rather than by the size of the corpus
+    :param use_mmap: read the file through a memory map instead of a buffered text stream
+    """
+    lines = iter_lines_mmap(file_path, encoding) if use_mmap else iter_lines(file_path, encoding)
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def available_cpus() -> int:
+    # the cpus this process may run on, which can be fewer than the cpus of the machine
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class LRUCache:
+    """
+    A mapping bounded to max_size entries which evicts the least recently used entry,
+    with counters of its hits, misses and evictions
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        # the value of the key, None on a miss
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, compute):
+        value = self.lookup(key)
+        if value is None:
+            value = compute(key)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        # drop the entries and keep the counters
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"size": len(self.entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits / lookups if lookups else None}
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'wb'):
+    """
+    Write a file through a temporary file which replaces it once it is complete, so readers never see a truncated
+    file. The temporary file is named by the host and the process, so the processes of the machines sharing
+    a directory never write to the same one.
+    """
+    tmp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
     try:
-        with open(file_path, 'r', encoding=encoding) as file:
-            for line in file:
-                corpus.append(line)
-    except FileNotFoundError as e:
-        print(f"Error: {e}")
-        raise
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        raise
-    return corpus
+        with open(tmp_path, mode) as file:
+            yield file
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def file_hash(file_path: str) -> str:
+    # content hash of a file, used to key cached artifacts
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
 
 
 def get_hf_normalizer(normalizer_config):
@@ -112,8 +227,9 @@ def get_hf_pretokenizer(pretokenizer_config):
         case 'Punctuation':
             return pre_tokenizers.Punctuation(**filter_config(pretokenizer_config))
         case 'Split':
-            pretokenizer_config['pattern'] = pretokenizer_config['pattern']['Regex']
-            pretokenizer_config['behavior'] = pretokenizer_config['behavior'].lower()
+            # the parsed config is shared by every load of the config file, so it is never mutated
+            pretokenizer_config = dict(pretokenizer_config, pattern=pretokenizer_config['pattern']['Regex'],
+                                       behavior=pretokenizer_config['behavior'].lower())
             return pre_tokenizers.Split(**filter_config(pretokenizer_config))
         case 'UnicodeScripts':
             return pre_tokenizers.UnicodeScripts()